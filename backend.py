@@ -0,0 +1,545 @@
+import os
+import time
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from collections import deque
+from itertools import repeat
+import numpy as np
+import schema
+from schema import FLAG_SURGE
+from db_writer import ReadingWriter
+from forecast import LoadForecaster
+from metrics import PipelineMetrics, profiled
+from column_store import ColumnStore
+from meter_registry import MeterRegistry, STATUS_SURGE, STATUS_FLAGS, status_from_flags
+from mqtt_ingest import MqttIngest, MqttSettings
+from ring_buffer import RingBuffer
+from rollups import update_rollups
+from simulator import FleetSimulator
+from snapshot import FleetSnapshot
+from surge_detector import SurgeDetector
+from tariff import Tariff
+
+# --- Configuration & Constants ---
+DB_NAME = os.environ.get("WATTFINDER_DB", "wattfinder_enterprise.db")
+
+# Tariff (INR): monthly slabs as (up to kWh, rate), the last open-ended, and
+# time-of-day multipliers on inclusive local hour windows, e.g.
+# {"slabs": [(100, 4.50), (300, 6.50), (None, 8.00)], "tod": [(18, 22, 1.2), (0, 5, 0.8)],
+#  "demand_charge": 150.0, "fixed_charge": 120.0}
+TARIFF_CONFIG = {"slabs": [(None, 7.50)], "tod": []}
+
+# DB writer batching (rows per commit / max seconds between commits)
+WRITE_BATCH_SIZE = 500
+WRITE_FLUSH_INTERVAL = 1.0
+WRITE_QUEUE_SIZE = 10000
+PARTITION_READINGS = False  # write readings into one table per UTC day
+
+# Simulator sampling: seconds between ticks (MIN_SAMPLE_INTERVAL at the fastest) and what
+# to do after a tick overruns later slots: "skip" them (the next tick integrates the whole
+# gap) or "catchup" by running them back to back (gaps over MAX_CATCHUP_TICKS are skipped)
+SAMPLE_INTERVAL = float(os.environ.get("WATTFINDER_INTERVAL", "2.0"))
+MIN_SAMPLE_INTERVAL = 0.1
+OVERRUN_POLICY = "skip"
+MAX_CATCHUP_TICKS = 10
+
+# Fixed seed makes simulated sessions reproducible (None = fresh entropy each run)
+SIMULATOR_SEED = None
+
+# "simulator" or "mqtt" (broker settings come from WATTFINDER_MQTT_* env vars)
+DATA_SOURCE = os.environ.get("WATTFINDER_SOURCE", "simulator")
+
+# External ingest (MQTT): readings per batch, max wait per batch, and the
+# longest gap between two readings of a meter that is still integrated
+INGEST_BATCH_SIZE = 5000
+INGEST_INTERVAL = 0.5
+MAX_READING_GAP_MS = 60_000
+AUTO_REGISTER_CONFIG = {"range": (0, 3000)}
+
+# Streaming surge detector: EWMA smoothing, z-score and step-jump thresholds,
+# and consecutive samples needed to open / close an event
+SURGE_ALPHA = 0.05
+SURGE_Z_THRESHOLD = 3.5
+SURGE_JUMP_THRESHOLD = 1.0
+SURGE_DEBOUNCE = 2
+SURGE_RELEASE = 3
+
+# Load forecast against each appliance's "goal" (kWh per day): hour-of-day
+# profiles remembering about FORECAST_MEMORY_DAYS of each hour, re-projected
+# every FORECAST_INTERVAL seconds. A meter alerts once it has FORECAST_WARMUP
+# seconds of data and its projected day (or month) exceeds the goal.
+FORECAST_MEMORY_DAYS = 7
+FORECAST_INTERVAL = 60
+FORECAST_WARMUP = 900
+MAX_BUDGET_ALERTS = 100
+
+# Hot-path stage timings and queue gauges (WATTFINDER_METRICS=0 turns them off), and
+# per-thread cProfile dumps: WATTFINDER_PROFILE=run writes run.monitor.prof and run.writer.prof
+METRICS_ENABLED = os.environ.get("WATTFINDER_METRICS", "1") != "0"
+PROFILE_PATH = os.environ.get("WATTFINDER_PROFILE")
+
+# Raw readings older than this many days are compacted into cold storage by the
+# collector, checked every COMPACT_INTERVAL seconds (None keeps everything raw)
+RAW_RETENTION_DAYS = 30
+COMPACT_INTERVAL = 3600
+
+# Mirror every committed reading into memory-mapped per-meter column files
+# (<db>.columns/) for fast analytics scans; written in the background every
+# column_store.SPILL_INTERVAL seconds, by one process at a time
+COLUMN_STORE = True
+
+# Samples of graph history kept per meter (2 hours at one sample per second)
+HISTORY_WINDOW = 7200
+
+# "active" lists inclusive hour windows; meters without it run all day
+APPLIANCES_CONFIG = {
+    "Fridge": {"range": (100, 200), "surge": 2.5, "prob": 0.05, "goal": 2.0, "icon": "🧊"},
+    "AC Unit": {"range": (800, 1500), "surge": 1.8, "prob": 0.02, "goal": 10.0, "icon": "❄️",
+                "active": [(10, 23)]},
+    "Washing Machine": {"range": (500, 1000), "surge": 2.0, "prob": 0.03, "goal": 2.5, "icon": "🧺",
+                        "active": [(8, 13)]},
+    "Smart TV": {"range": (50, 150), "surge": 1.5, "prob": 0.01, "goal": 1.5, "icon": "📺"},
+    "Microwave": {"range": (800, 1200), "surge": 1.2, "prob": 0.04, "goal": 1.0, "icon": "🍕",
+                  "active": [(7, 9), (18, 21)]}
+}
+
+# --- Backend Logic (Data) ---
+
+class EnergyBackend:
+    """Collection pipeline: source -> accounting -> snapshot + DB. No GUI dependencies."""
+
+    def __init__(self, registry=None, db_name=DB_NAME, metrics=METRICS_ENABLED, profile=PROFILE_PATH,
+                 interval=SAMPLE_INTERVAL, overrun=OVERRUN_POLICY):
+        if interval < MIN_SAMPLE_INTERVAL:
+            raise ValueError(f"sample interval must be at least {MIN_SAMPLE_INTERVAL} s")
+        if overrun not in ("skip", "catchup"):
+            raise ValueError(f"unknown overrun policy {overrun!r}")
+        self.db_name = db_name
+        self.interval = interval
+        self.overrun = overrun
+        self.metrics = PipelineMetrics() if metrics else None
+        self.columns = None
+        if COLUMN_STORE:
+            try:
+                self.columns = ColumnStore(f"{db_name}.columns")
+            except RuntimeError as e:
+                logging.warning(f"Column store mirror disabled: {e}")
+        self.profile = profile
+        self.registry = registry or MeterRegistry.from_config(APPLIANCES_CONFIG)
+        self.init_db()
+        self.detector = SurgeDetector(alpha=SURGE_ALPHA, z_threshold=SURGE_Z_THRESHOLD,
+                                      roc_threshold=SURGE_JUMP_THRESHOLD, debounce=SURGE_DEBOUNCE,
+                                      release=SURGE_RELEASE)
+        self.writer = ReadingWriter(self.db_name, batch_size=WRITE_BATCH_SIZE,
+                                    flush_interval=WRITE_FLUSH_INTERVAL, max_queue=WRITE_QUEUE_SIZE,
+                                    partitioned=PARTITION_READINGS,
+                                    flush_hooks=[update_rollups, self._write_surge_events]
+                                    + ([self.columns.flush_hook] if self.columns else []),
+                                    metrics=self.metrics, profile=profile and f"{profile}.writer.prof")
+        self.running = False
+        self.simulator = FleetSimulator(self.registry, seed=SIMULATOR_SEED, interval=interval)
+        self.tariff = Tariff.from_config(TARIFF_CONFIG)
+        self.month_kwh = {}  # site kWh per month so far, for the tariff slabs
+        self.forecaster = LoadForecaster(memory_s=FORECAST_MEMORY_DAYS * 3600, warmup_s=FORECAST_WARMUP,
+                                         utc_offset_ms=self.tariff.utc_offset_ms)
+        self.forecast = None  # latest LoadForecaster.project() result, replaced whole
+        self.alerts = deque(maxlen=MAX_BUDGET_ALERTS)
+        self._next_forecast = 0.0
+
+        # Per-meter state, indexed by registry meter id. Only the monitor thread
+        # replaces the snapshot; everyone else just reads self.snapshot.
+        self.snapshot = FleetSnapshot.empty(self.registry.names)
+        self.history = RingBuffer(0, HISTORY_WINDOW)
+        self.last_ts = np.zeros(0, dtype=np.int64)  # per meter, ingest thread only
+        self.rejected = 0  # ingest readings dropped for non-finite power
+        self.session_start = None
+        self.source = None
+        self._thread = None
+        self._wake = threading.Event()  # set by stop_monitoring to cut the tick wait short
+        self.samples = 0          # simulator ticks this session
+        self.skipped = 0          # slots skipped after overruns
+        self._sample_span = None  # (first, last) monotonic sample times
+        if self.metrics:
+            self._register_gauges()
+
+    def _register_gauges(self):
+        m, writer = self.metrics, self.writer
+        m.register("meters", "gauge", "Registered meters", lambda: self.registry.count)
+        m.register("writer_queue_batches", "gauge", "Row batches waiting for the DB writer",
+                   writer.queue.qsize)
+        m.register("rows_written_total", "counter", "Readings committed to SQLite", lambda: writer.rows_written)
+        m.register("batches_written_total", "counter", "Writer transactions committed",
+                   lambda: writer.batches_written)
+        m.register("batches_failed_total", "counter", "Writer batches rolled back after an insert or hook error",
+                   lambda: writer.batches_failed)
+        m.register("rows_dropped_total", "counter", "Readings dropped on a full writer queue",
+                   lambda: writer.dropped)
+        m.register("readings_rejected_total", "counter", "Ingest readings dropped for non-finite power",
+                   lambda: self.rejected)
+        m.register("ticks_skipped_total", "counter", "Simulator slots skipped after overruns",
+                   lambda: self.skipped)
+        m.register("sample_interval_seconds", "gauge", "Configured simulator sampling interval",
+                   lambda: self.interval)
+        m.register("source_queue_depth", "gauge", "Readings waiting in the ingest source",
+                   lambda: self.source.stats()["queue_depth"] if self.source else 0)
+        m.register("source_lag_ms", "gauge", "Delay between a reading's timestamp and its arrival",
+                   lambda: self.source.stats()["last_lag_ms"] if self.source else 0)
+        m.register("forecast_day_kwh", "gauge", "Projected fleet kWh for today",
+                   lambda: float(self.forecast["day_projected_kwh"].sum()) if self.forecast else 0)
+        m.register("budget_alerts_total", "counter", "Budget alerts raised this session", lambda: len(self.alerts))
+
+    def init_db(self):
+        with sqlite3.connect(self.db_name) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Creates the tables, or upgrades an older database in place
+            schema.migrate(conn)
+            self.registry.save_to_db(conn)
+            conn.commit()
+
+    def register_meter(self, name, cfg):
+        """Add a meter while the system is running. State arrays grow on the next tick."""
+        meter_id = self.registry.register(name, cfg)
+        with sqlite3.connect(self.db_name) as conn:
+            self.registry.save_to_db(conn, [name])
+        return meter_id
+
+    def meter_id(self, name, auto_register=True):
+        """Resolve a meter name for ingest sources, registering unknown meters on first sight."""
+        meter_id = self.registry.index.get(name)
+        if meter_id is None and auto_register:
+            meter_id = self.register_meter(name, AUTO_REGISTER_CONFIG)
+        return meter_id
+
+    @property
+    def latest_readings(self):
+        return self.snapshot.latest_readings()
+
+    @property
+    def surge_count(self):
+        return self.snapshot.surge_count()
+
+    def open_source(self, kind=DATA_SOURCE):
+        """Ingest source for start_monitoring: None for the built-in simulator, or an MqttIngest."""
+        if kind == "simulator":
+            return None
+        if kind == "mqtt":
+            return MqttIngest(MqttSettings(), self.meter_id)
+        raise ValueError(f"unknown data source {kind!r}")
+
+    def start_monitoring(self, update_callback, source=None):
+        """Start collecting from the built-in simulator, or from an ingest source such as MqttIngest.
+
+        The source is started first, so if it fails (e.g. no broker) the
+        exception propagates with the backend still stopped.
+        """
+        if source is not None:
+            source.start()
+        try:
+            now_ms = int(time.time() * 1000)
+            with sqlite3.connect(self.db_name) as conn:
+                self.tariff.load_months(conn, [now_ms], self.month_kwh)
+                self.forecaster.seed(conn, self.registry.db_id, now_ms)
+        except Exception:
+            if source is not None:
+                source.stop()
+            raise
+        self.running = True
+        self.session_start = datetime.now()
+        self._wake.clear()
+        self.samples = self.skipped = 0
+        self._sample_span = None
+        self._next_forecast = 0.0
+        self.writer.start()
+        self.source = source
+        target = self._monitor_loop if source is None else self._ingest_loop
+        if self.profile:
+            target = profiled(target, f"{self.profile}.monitor.prof")
+        self._thread = threading.Thread(target=target, args=(update_callback,), name="EnergyBackend", daemon=True)
+        self._thread.start()
+
+    def stop_monitoring(self):
+        if self.running:
+            self.running = False
+            self._wake.set()
+            if self.source is not None:
+                self.source.stop()
+            # Let the current tick finish so nothing is submitted after the writer stops
+            if self._thread is not None and self._thread is not threading.current_thread():
+                self._thread.join(5.0)
+                if self._thread.is_alive():
+                    logging.warning("Monitor thread still running after 5s; its last rows may miss the DB")
+            self.detector.close_all(int(time.time() * 1000))
+            self.writer.stop()
+            if self.columns:
+                self.columns.close()
+            self._save_session()
+
+    def _save_session(self):
+        if not self.session_start:
+            return
+            
+        snap = self.snapshot
+        total_kwh = snap.total_kwh
+        total_cost = snap.total_cost
+        total_surges = snap.total_surges
+        # Measured mean seconds between simulator samples (None for ingest sessions)
+        sample_interval = None
+        if self.samples > 1:
+            first, last = self._sample_span
+            sample_interval = (last - first) / (self.samples - 1)
+        
+        with sqlite3.connect(self.db_name) as conn:
+            # Events closed after the writer's last flush
+            self._write_surge_events(conn)
+            cursor = conn.cursor()
+            cursor.execute(
+                '''INSERT INTO sessions (start_time, end_time, total_kwh, total_cost, surges,
+                                         sample_interval, samples, skipped_samples) VALUES (?,?,?,?,?,?,?,?)''',
+                (self.session_start.strftime("%Y-%m-%d %H:%M:%S"),
+                 datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                 total_kwh, total_cost, total_surges,
+                 sample_interval, self.samples or None, self.skipped if self.samples else None)
+            )
+            conn.commit()
+
+    def _write_surge_events(self, conn, rows=None):
+        self.detector.write_events(conn, self.registry.db_id)
+
+    def _monitor_loop(self, update_callback):
+        """Fixed-rate sampling on the monotonic clock.
+
+        Tick k is due at origin + k * interval, so work time never accumulates
+        as drift. Each sample integrates energy over the time actually elapsed
+        since the previous one, and timestamps follow the same clock.
+        """
+        m = self.metrics
+        interval = self.interval
+        origin, wall_origin = time.monotonic(), time.time()
+        k = 0
+        prev = None
+        while self.running:
+            now = time.monotonic()
+            due = origin + k * interval
+            behind = int((now - due) // interval)  # later slots already missed
+            if self.overrun == "catchup" and behind <= MAX_CATCHUP_TICKS:
+                sample = due  # late slots still run, stamped with their scheduled time
+            else:
+                if behind > 0:
+                    k += behind
+                    self.skipped += behind
+                    due += behind * interval
+                sample = now
+            if m:
+                # Time lost so far: slots skipped this session plus how late this one runs
+                m.tick(now - due, self.skipped * interval + max(now - due, 0.0))
+
+            elapsed = interval if prev is None else min(sample - prev, MAX_READING_GAP_MS / 1000)
+            self.tick(datetime.fromtimestamp(wall_origin + sample - origin), elapsed)
+            self.samples += 1
+            self._sample_span = (self._sample_span or (sample,))[:1] + (sample,)
+            prev = sample
+
+            if not self.running:
+                break  # stop_monitoring() is waiting; don't call into a UI that is shutting down
+            try:
+                if m:
+                    t = time.perf_counter()
+                update_callback()
+                if m:
+                    m.lap("ui_callback", t)
+            except RuntimeError:
+                break
+
+            k += 1
+            wait = origin + k * interval - time.monotonic()
+            if wait > 0:
+                self._wake.wait(wait)
+
+    def tick(self, now, elapsed=None):
+        """One simulator tick for the whole fleet: account, publish and queue the rows.
+
+        elapsed is the time in seconds this sample stands for (default: the sample interval).
+        """
+        m = self.metrics
+        if m:
+            t = time.perf_counter()
+        ts_ms = int(now.timestamp() * 1000)
+        n = self.registry.count
+
+        # Whole-fleet simulation and accounting
+        power, status = self.simulator.tick(now.hour, n)
+        if m:
+            t = m.lap("simulate", t)
+        kwh_inc = power * (self.interval if elapsed is None else elapsed) / 3.6e6  # W * s -> kWh
+        cost_inc = self.tariff.price(np.full(n, ts_ms), kwh_inc, self.month_kwh)
+        surging, opened = self.detector.update(np.arange(n), np.full(n, ts_ms), power,
+                                               status == STATUS_SURGE)
+        self._update_forecast(np.arange(n), np.full(n, ts_ms), power,
+                              self.interval if elapsed is None else elapsed, kwh_inc, cost_inc)
+        status = np.where(surging, STATUS_SURGE, status).astype(np.int8)
+        self._publish(now, n, power, status, kwh_inc, cost_inc, opened.astype(np.int64))
+        if m:
+            t = m.lap("accumulate", t)
+
+        # DB logging is batched by the writer thread
+        self.writer.submit(list(zip(
+            self.registry.db_id[:n].tolist(), repeat(ts_ms), power.tolist(),
+            kwh_inc.tolist(), cost_inc.tolist(), STATUS_FLAGS[status].tolist()
+        )))
+        if m:
+            m.lap("enqueue", t)
+            m.count_rows(n)
+
+    def _ingest_loop(self, update_callback):
+        while self.running:
+            batch = self.source.drain(INGEST_BATCH_SIZE, INGEST_INTERVAL)
+            if batch is None:
+                continue
+            self.apply_readings(*batch)
+            if not self.running:
+                break
+
+            try:
+                if self.metrics:
+                    t = time.perf_counter()
+                update_callback()
+                if self.metrics:
+                    self.metrics.lap("ui_callback", t)
+            except RuntimeError:
+                break
+
+    def apply_readings(self, meter_ids, ts_ms, power, flags):
+        """Account a batch of externally reported readings (any order, several per meter).
+
+        Each reading's energy is its power times the time since that meter's
+        previous reading, capped at MAX_READING_GAP_MS. Readings with non-finite
+        power are dropped: one NaN would poison the tariff slabs and every total after it.
+        """
+        ok = np.isfinite(power)
+        if not ok.all():
+            self.rejected += int(len(ok) - ok.sum())
+            meter_ids, ts_ms, power, flags = meter_ids[ok], ts_ms[ok], power[ok], flags[ok]
+            if not len(meter_ids):
+                return
+        m = self.metrics
+        if m:
+            t = time.perf_counter()
+        n = self.registry.count
+        order = np.lexsort((ts_ms, meter_ids))
+        ids, ts, p, fl = meter_ids[order], ts_ms[order], power[order], flags[order]
+
+        # Previous timestamp of the same meter, from this batch or the last one
+        self.last_ts = last_ts = _padded(self.last_ts, n)
+        first = np.ones(len(ids), dtype=bool)
+        first[1:] = ids[1:] != ids[:-1]
+        prev_ts = np.empty_like(ts)
+        prev_ts[1:] = ts[:-1]
+        prev_ts[first] = last_ts[ids[first]]
+        dt = np.where(prev_ts > 0, np.clip(ts - prev_ts, 0, MAX_READING_GAP_MS), 0)
+        kwh_inc = p * dt / 3.6e9  # W * ms -> kWh
+        cost_inc = self.tariff.price(ts, kwh_inc, self.month_kwh)
+        surging, opened = self.detector.update(ids, ts, p, (fl & FLAG_SURGE) != 0)
+        fl = fl | np.where(surging, FLAG_SURGE, 0)
+        self._update_forecast(ids, ts, p, dt / 1000, kwh_inc, cost_inc)
+
+        # Latest reading per meter drives the live view
+        last = np.ones(len(ids), dtype=bool)
+        last[:-1] = ids[1:] != ids[:-1]
+        latest_ids = ids[last]
+        last_ts[latest_ids] = ts[last]
+        prev = self.snapshot
+        power_now = _padded(prev.power, n).copy()
+        power_now[latest_ids] = p[last]
+        status_now = _padded(prev.status, n).copy()
+        status_now[latest_ids] = status_from_flags(fl[last], p[last])
+
+        self._publish(datetime.now(), n, power_now, status_now,
+                      np.bincount(ids, kwh_inc, n), np.bincount(ids, cost_inc, n),
+                      np.bincount(ids, opened, n).astype(np.int64))
+        if m:
+            t = m.lap("accumulate", t)
+
+        self.writer.submit(list(zip(
+            self.registry.db_id[ids].tolist(), ts.tolist(), p.tolist(),
+            kwh_inc.tolist(), cost_inc.tolist(), fl.tolist()
+        )))
+        if m:
+            m.lap("enqueue", t)
+            m.count_rows(len(ids))
+
+    def _update_forecast(self, ids, ts_ms, power, seconds, kwh_inc, cost_inc):
+        """Fold readings into the forecaster; re-project and raise alerts every FORECAST_INTERVAL."""
+        self.forecaster.update(ids, ts_ms, power, seconds, kwh_inc, cost_inc)
+        if time.monotonic() < self._next_forecast:
+            return
+        self._next_forecast = time.monotonic() + FORECAST_INTERVAL
+        self.forecast, alerts = self.forecaster.check(int(ts_ms.max()), self.registry.goal)
+        for alert in alerts:
+            alert["name"] = self.registry.names[alert["meter"]]
+            alert["ts"] = int(ts_ms.max())
+            logging.warning(f"Budget alert: {alert['name']} is on track for {alert['projected_kwh']:.2f} kWh "
+                            f"{'today' if alert['period'] == 'day' else 'this month'} against a goal of {alert['goal_kwh']:.2f} kWh "
+                            f"({alert['used_kwh']:.2f} kWh used so far)")
+            self.alerts.append(alert)
+
+    def _publish(self, now, n, power, status, kwh_inc, cost_inc, surge_inc):
+        # Buffer for graphing
+        self.history.resize_series(n)
+        self.history.append(power)
+
+        # Copy-on-write: build new arrays and publish them with one reference swap
+        prev = self.snapshot
+        self.snapshot = FleetSnapshot(
+            prev.version + 1, now, self.registry.names, power,
+            _padded(prev.kwh, n) + kwh_inc,
+            _padded(prev.cost, n) + cost_inc,
+            _padded(prev.surges, n) + surge_inc,
+            status, self.history.marker()
+        )
+
+    def get_history_data(self, last=None):
+        """Per-meter ordered history as zero-copy array views."""
+        snap = self.snapshot
+        return dict(zip(snap.meter_names(), snap.history(last)))
+    
+    def get_insights_summary(self):
+        """Generate data summary for AI context"""
+        return insights_summary(self.snapshot, self.forecast)
+
+
+def insights_summary(snap, forecast=None):
+    """AI context text for a FleetSnapshot and optional forecast (shared with RemoteBackend)."""
+    names = snap.names
+    
+    # Find top consumers
+    top_3 = [(names[i], snap.cost[i], snap.kwh[i]) for i in np.argsort(snap.cost)[::-1][:3]]
+    
+    # Surge analysis
+    surge_apps = [names[i] for i in np.flatnonzero(snap.surges)]
+    
+    summary = f"""Current System Status:
+- Total Load: {snap.total_power:.0f}W
+- Session Cost: ₹{snap.total_cost:.2f}
+- Top Consumers: {', '.join([f"{n} (₹{c:.2f})" for n,c,_ in top_3])}
+- Surges Detected: {', '.join(surge_apps) if surge_apps else 'None'}
+- Total Surge Events: {snap.total_surges}"""
+    if forecast is not None:
+        over = [names[i] for i in np.flatnonzero(
+            (forecast["goal_day_kwh"] > 0) & (forecast["day_projected_kwh"] > forecast["goal_day_kwh"]))]
+        summary += f"""
+- Projected Today: {forecast['day_projected_kwh'].sum():.2f} kWh (goal {forecast['goal_day_kwh'].sum():.2f} kWh)
+- Projected This Month: {forecast['month_projected_kwh'].sum():.1f} kWh / ₹{forecast['month_projected_cost'].sum():.2f}
+- Over Daily Goal: {', '.join(over) if over else 'None'}"""
+    
+    return summary
+
+
+def _padded(arr, n):
+    """Return arr zero-extended to length n (for meters registered since the last tick)."""
+    if len(arr) >= n:
+        return arr
+    out = np.zeros(n, dtype=arr.dtype)
+    out[:len(arr)] = arr
+    return out
@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timedelta
+import numpy as np
+import schema
+from backend import EnergyBackend, APPLIANCES_CONFIG, HISTORY_WINDOW
+from db_writer import ReadingWriter
+from meter_registry import MeterRegistry
+from rollups import query_usage, query_series
+from sharded_ingest import synthetic_fleet
+from simulator import FleetSimulator
+from tariff import Tariff
+
+# Meters used to reach each DB size in the query benchmark (rows = meters x ticks at 60 s)
+QUERY_METERS = 100
+
+
+def timed(fn, repeat=5):
+    """Median and min wall time of fn() over repeat runs, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(times), "min_s": min(times), "runs": repeat}
+
+
+def fresh_db(workdir, name):
+    path = os.path.join(workdir, name)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return path
+
+
+# --- Ingest: the _monitor_loop work per tick, minus the sleep ---
+
+def bench_ingest(workdir, meter_counts, ticks):
+    results = []
+    for meters in meter_counts:
+        db = fresh_db(workdir, f"ingest_{meters}.db")
+        backend = EnergyBackend(MeterRegistry.from_config(synthetic_fleet(meters, APPLIANCES_CONFIG)), db)
+        backend.writer.start()
+        now = datetime.now()
+        start = time.perf_counter()
+        for i in range(ticks):
+            backend.tick(now + timedelta(seconds=2 * i))
+        tick_time = time.perf_counter() - start
+        backend.writer.stop(timeout=None)
+        total = time.perf_counter() - start
+        history = timed(lambda: backend.get_history_data())
+        results.append({
+            "meters": meters, "ticks": ticks,
+            "tick_ms": tick_time / ticks * 1000,
+            "readings_per_s": meters * ticks / tick_time,
+            "readings_per_s_incl_db": backend.writer.rows_written / total,
+            "dropped": backend.writer.dropped,
+            "history_view_ms": history["median_s"] * 1000,
+        })
+        logging.info(f"ingest {meters} meters: {results[-1]['readings_per_s']:.0f} readings/s")
+    return results
+
+
+# --- Insert: ReadingWriter throughput by batch size and journal settings ---
+
+def bench_insert(workdir, rows, batch_sizes, modes):
+    registry = MeterRegistry.from_config(synthetic_fleet(100, APPLIANCES_CONFIG))
+    ts0 = int(time.time() * 1000)
+    sample = [(1 + i % 100, ts0 + i * 20, 500.0, 0.0003, 0.002, 0) for i in range(rows)]
+    results = []
+    for journal, synchronous in modes:
+        for batch in batch_sizes:
+            n = min(rows, batch * 200)  # tiny batches get fewer rows so the run stays short
+            db = fresh_db(workdir, "insert.db")
+            with sqlite3.connect(db) as conn:
+                schema.migrate(conn)
+                registry.save_to_db(conn)
+            writer = ReadingWriter(db, batch_size=batch, flush_interval=3600, max_queue=n + 1,
+                                   synchronous=synchronous, journal_mode=journal)
+            writer.start()
+            start = time.perf_counter()
+            for i in range(0, n, batch):
+                writer.submit(sample[i:i + batch])
+            writer.stop(timeout=None)
+            elapsed = time.perf_counter() - start
+            results.append({"journal_mode": journal, "synchronous": synchronous, "batch_size": batch,
+                            "rows": writer.rows_written, "rows_per_s": writer.rows_written / elapsed})
+            logging.info(f"insert {journal}/{synchronous} batch {batch}: {results[-1]['rows_per_s']:.0f} rows/s")
+    return results
+
+
+# --- Queries: rollup and raw reads against DBs of increasing size ---
+
+def build_query_db(workdir, rows):
+    """Replay simulated history until the DB holds `rows` readings (cached between runs)."""
+    path = os.path.join(workdir, f"query_{rows}.db")
+    if os.path.exists(path):
+        with sqlite3.connect(path) as conn:
+            if conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0] >= rows:
+                return path
+        fresh_db(workdir, f"query_{rows}.db")
+    registry = MeterRegistry.from_config(synthetic_fleet(QUERY_METERS, APPLIANCES_CONFIG))
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    schema.migrate(conn)
+    registry.save_to_db(conn)
+    sim = FleetSimulator(registry, seed=1, interval=60.0)
+    end = int(time.time() * 1000) // schema.MINUTE_MS * schema.MINUTE_MS
+    start = end - (rows // QUERY_METERS) * schema.MINUTE_MS
+    logging.info(f"building {rows}-row query DB (cached in {path})")
+    sim.replay(conn, start, end, Tariff())
+    conn.close()
+    return path
+
+
+def bench_queries(workdir, sizes):
+    results = []
+    for rows in sizes:
+        path = build_query_db(workdir, rows)
+        conn = sqlite3.connect(path)
+        lo, hi = conn.execute("SELECT MIN(ts), MAX(ts) + 1 FROM readings").fetchone()
+        day = schema.DAY_MS
+        queries = {
+            "usage_last_day": lambda: query_usage(conn, hi - day, hi),
+            "usage_all": lambda: query_usage(conn, lo, hi),
+            "usage_unaligned_edges": lambda: query_usage(conn, lo + 12_345, hi - 54_321),
+            "usage_one_meter_all": lambda: query_usage(conn, lo, hi, appliance_id=1),
+            "series_hourly_last_week": lambda: query_series(conn, max(lo, hi - 7 * day), hi, schema.HOUR_MS),
+            "series_daily_all": lambda: query_series(conn, lo, hi, day),
+            "raw_one_meter_last_hour": lambda: schema.query_readings(conn, hi - schema.HOUR_MS, hi, 1),
+        }
+        for name, fn in queries.items():
+            t = timed(fn)
+            results.append({"rows": rows, "query": name, "median_ms": t["median_s"] * 1000,
+                            "min_ms": t["min_s"] * 1000})
+            logging.info(f"query {name} @ {rows} rows: {t['median_s'] * 1000:.2f} ms")
+        conn.close()
+    return results
+
+
+# --- Render: DashboardApp.update_ui / update_graph on an offscreen Agg canvas ---
+
+class _Widget:
+    def __init__(self):
+        self.options = {}
+
+    def configure(self, **options):
+        self.options.update(options)
+
+
+def bench_render(workdir, meter_counts, frames):
+    """Runs the dashboard's own update_ui/update_graph code against stub widgets and Agg.
+
+    No display is needed; Tk widget drawing itself is not measured.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from wattfinder import DashboardApp
+
+    class HeadlessDashboard:
+        update_ui = DashboardApp.update_ui
+        update_graph = DashboardApp.update_graph
+        _configure_if_changed = DashboardApp._configure_if_changed
+        _init_graph = DashboardApp._init_graph
+        _on_graph_draw = DashboardApp._on_graph_draw
+
+    results = []
+    for meters in meter_counts:
+        db = fresh_db(workdir, f"render_{meters}.db")
+        backend = EnergyBackend(MeterRegistry.from_config(synthetic_fleet(meters, APPLIANCES_CONFIG)), db)
+        app = HeadlessDashboard()
+        app.backend = backend
+        app._rendered = {}
+        app.meters = {name: _Widget() for name in backend.registry.names}
+        app.stat_labels = {name: {k: _Widget() for k in ("kwh", "cost", "status")} for name in backend.registry.names}
+        for card in ("card_total_power", "card_total_cost", "card_surges", "card_efficiency"):
+            setattr(app, card, _Widget())
+        fig = Figure(figsize=(10, 4), dpi=100)
+        app.ax = fig.add_subplot(111)
+        app.canvas = FigureCanvasAgg(fig)
+        app._init_graph()
+
+        now = datetime.now()
+        for i in range(min(frames, HISTORY_WINDOW)):
+            backend.tick(now + timedelta(seconds=2 * i))  # fill history; writer is not running
+        backend.writer.queue.queue.clear()
+        app.canvas.draw()
+
+        times = []
+        for i in range(frames):
+            backend.tick(now + timedelta(seconds=2 * (frames + i)))
+            backend.writer.queue.queue.clear()
+            start = time.perf_counter()
+            app.update_ui()
+            times.append(time.perf_counter() - start)
+        results.append({"meters": meters, "frames": frames,
+                        "frame_ms_median": statistics.median(times) * 1000,
+                        "frame_ms_p95": float(np.percentile(times, 95)) * 1000})
+        logging.info(f"render {meters} meters: {results[-1]['frame_ms_median']:.2f} ms/frame")
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(old, new):
+    """Print per-metric ratios new/old for entries that match on their parameters."""
+    for suite, entries in new["results"].items():
+        for entry in entries:
+            keys = {k: v for k, v in entry.items() if not isinstance(v, float)}
+            match = next((e for e in old["results"].get(suite, [])
+                          if all(e.get(k) == v for k, v in keys.items())), None)
+            if match is None:
+                continue
+            for metric, value in entry.items():
+                if isinstance(value, float) and match.get(metric):
+                    print(f"{suite:8} {keys} {metric}: {match[metric]:.4g} -> {value:.4g} "
+                          f"({value / match[metric]:.2f}x)")
+
+
+def _ints(text):
+    return [int(float(v)) for v in text.split(",") if v]
+
+
+SUITES = ("ingest", "insert", "query", "render")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WattFinder performance benchmarks (headless)")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--workdir", default="bench_data", help="scratch DBs; query DBs are cached here")
+    parser.add_argument("--suites", default=",".join(SUITES))
+    parser.add_argument("--meters", default="10,1000,10000", help="fleet sizes for ingest and render")
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--insert-rows", type=int, default=200_000)
+    parser.add_argument("--batch-sizes", default="1,100,1000,10000")
+    parser.add_argument("--sizes", default="1e6", help="DB sizes in rows for queries, e.g. 1e6,1e7,1e8")
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    os.makedirs(args.workdir, exist_ok=True)
+    suites = args.suites.split(",")
+    meters = _ints(args.meters)
+    results = {}
+    if "ingest" in suites:
+        results["ingest"] = bench_ingest(args.workdir, meters, args.ticks)
+    if "insert" in suites:
+        modes = [("WAL", "NORMAL"), ("WAL", "FULL"), ("DELETE", "FULL")]
+        results["insert"] = bench_insert(args.workdir, args.insert_rows, _ints(args.batch_sizes), modes)
+    if "query" in suites:
+        results["query"] = bench_queries(args.workdir, _ints(args.sizes))
+    if "render" in suites:
+        results["render"] = bench_render(args.workdir, meters, args.frames)
+
+    report = {"environment": environment(), "config": vars(args), "results": results}
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"Results written to {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
@@ -0,0 +1,317 @@
+import csv
+import json
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+import numpy as np
+import schema
+from schema import FLAG_SURGE, FLAG_STANDBY
+from codec import read_spool, to_records, Spool
+from rollups import update_rollups
+from tariff import Tariff
+
+CHUNK_SIZE = 50000
+
+# Accepted CSV/Parquet column names -> canonical field
+COLUMN_ALIASES = {
+    "appliance": "appliance", "meter": "appliance", "name": "appliance",
+    "appliance_id": "appliance_id", "meter_id": "appliance_id",
+    "timestamp": "ts", "ts": "ts", "time": "ts",
+    "power": "power", "watts": "power", "power_w": "power",
+    "kwh": "kwh", "cost": "cost", "cost_inr": "cost",
+    "flags": "flags", "status": "status", "anomaly": "status",
+}
+
+
+def parse_timestamp(value):
+    """Epoch milliseconds from an integer/float epoch-ms value or an ISO local-time string."""
+    try:
+        return int(float(value))
+    except ValueError:
+        return int(datetime.fromisoformat(str(value)).timestamp() * 1000)
+
+
+def status_to_flags(status):
+    status = str(status)
+    if "SURGE" in status.upper():
+        return FLAG_SURGE
+    if status.lower() == "standby":
+        return FLAG_STANDBY
+    return 0
+
+
+# --- Readers: each yields dicts of canonical column -> list/array, CHUNK_SIZE rows at a time ---
+
+def read_csv_chunks(path, chunk_size, skip=0):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = [COLUMN_ALIASES.get(h.strip().lower(), h.strip().lower()) for h in next(reader)]
+        for _ in range(skip):
+            if next(reader, None) is None:
+                return
+        while True:
+            rows = [row for _, row in zip(range(chunk_size), reader)]
+            if not rows:
+                return
+            yield dict(zip(header, zip(*rows)))
+
+
+def read_parquet_chunks(path, chunk_size, skip=0):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet support needs pyarrow: pip install pyarrow")
+    seen = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        if seen + batch.num_rows <= skip:
+            seen += batch.num_rows
+            continue
+        batch = batch.slice(max(0, skip - seen))
+        seen += batch.num_rows
+        yield {COLUMN_ALIASES.get(k.lower(), k.lower()): v
+               for k, v in batch.to_pydict().items()}
+
+
+def read_binary_chunks(path, chunk_size, skip=0):
+    """codec spool/dump files. meter_id in each record is the appliances.id."""
+    records = read_spool(path)
+    for start in range(skip, len(records), chunk_size):
+        part = records[start:start + chunk_size]
+        yield {"appliance_id": part["meter_id"], "ts": part["ts"],
+               "power": part["power"], "flags": part["flags"]}
+
+
+READERS = {"csv": read_csv_chunks, "parquet": read_parquet_chunks, "bin": read_binary_chunks}
+
+
+class Importer:
+    """Streams a dump into readings: one transaction per chunk, resumable.
+
+    Progress is stored in import_checkpoints inside the same transaction as
+    the chunk, so a crashed or interrupted import resumes exactly where the
+    last committed chunk ended. Rows whose power, kWh or cost stay empty after
+    filling them in are skipped and counted in `skipped`.
+    """
+
+    def __init__(self, conn, interval_s=None, tariff=None, partitioned=False):
+        self.conn = conn
+        self.interval_s = interval_s  # used when only one of power/kWh is present
+        self.tariff = tariff or Tariff()  # prices rows that carry no cost
+        self.month_kwh = {}
+        self.partitioned = partitioned
+        self.skipped = 0
+        self._appliance_ids = dict(conn.execute("SELECT name, id FROM appliances"))
+        conn.execute('''CREATE TABLE IF NOT EXISTS import_checkpoints
+                        (source TEXT PRIMARY KEY, rows_done INTEGER NOT NULL)''')
+
+    def checkpoint(self, source):
+        row = self.conn.execute("SELECT rows_done FROM import_checkpoints WHERE source = ?",
+                                (source,)).fetchone()
+        return row[0] if row else 0
+
+    def run(self, path, fmt, chunk_size=CHUNK_SIZE, defer_indexes=True):
+        done = self.checkpoint(path)
+        if done:
+            logging.info(f"Resuming {path} after {done} rows")
+        if defer_indexes:
+            schema.drop_readings_indexes(self.conn)
+        try:
+            for chunk in READERS[fmt](path, chunk_size, skip=done):
+                rows, read = self._rows(chunk)
+                with self.conn:
+                    if self.partitioned:
+                        schema.insert_partitioned(self.conn, rows)
+                    else:
+                        self.conn.executemany(schema.READINGS_INSERT, rows)
+                    update_rollups(self.conn, rows)
+                    done += read  # source rows, so a resume skips the same ones
+                    self.conn.execute("INSERT OR REPLACE INTO import_checkpoints VALUES (?, ?)",
+                                      (path, done))
+                logging.info(f"{path}: {done} rows read, {self.skipped} skipped for missing values")
+        finally:
+            if defer_indexes:
+                logging.info("Rebuilding readings indexes")
+                with self.conn:
+                    schema.create_readings_indexes(self.conn)
+        return done
+
+    def _appliance_id(self, name):
+        aid = self._appliance_ids.get(name)
+        if aid is None:
+            with self.conn:
+                self.conn.execute("INSERT OR IGNORE INTO appliances (name) VALUES (?)", (name,))
+            aid = self.conn.execute("SELECT id FROM appliances WHERE name = ?", (name,)).fetchone()[0]
+            self._appliance_ids[name] = aid
+        return aid
+
+    def _rows(self, chunk):
+        """Fill in missing columns and cells; returns (schema-v2 row tuples, source rows read).
+
+        An empty power or kWh cell is derived from the other one when the
+        interval is known and an empty cost cell is priced with the tariff;
+        rows still missing a value are left out (NaN must not reach the rollups).
+        """
+        if "appliance_id" in chunk:
+            ids = np.asarray(chunk["appliance_id"], dtype=np.int64)
+        else:
+            ids = np.array([self._appliance_id(name) for name in chunk["appliance"]], dtype=np.int64)
+        n = len(ids)
+
+        ts_col = chunk["ts"]
+        if isinstance(ts_col, np.ndarray):
+            ts = ts_col.astype(np.int64)
+        else:
+            ts = np.array([parse_timestamp(v) for v in ts_col], dtype=np.int64)
+
+        power = _float_col(chunk.get("power"), n)
+        kwh = _float_col(chunk.get("kwh"), n)
+        hours = (self.interval_s or 0) / 3600
+        if kwh is None:
+            if power is None or not hours:
+                raise SystemExit("Need a kwh column, or power plus --interval")
+            kwh = power * hours / 1000
+        if power is None:
+            power = kwh * 1000 / hours if hours else np.zeros(n)
+        if hours:
+            power = np.where(np.isnan(power), kwh * 1000 / hours, power)
+            kwh = np.where(np.isnan(kwh), power * hours / 1000, kwh)
+        cost = _float_col(chunk.get("cost"), n)
+        if cost is None:
+            cost = np.full(n, np.nan)
+        unpriced = np.flatnonzero(np.isnan(cost) & np.isfinite(kwh))
+        if len(unpriced):
+            cost[unpriced] = self.tariff.price(ts[unpriced], kwh[unpriced],
+                                               self.tariff.load_months(self.conn, ts[unpriced], self.month_kwh))
+
+        if "flags" in chunk:
+            flags = np.asarray(chunk["flags"], dtype=np.int64)
+        elif "status" in chunk:
+            flags = np.array([status_to_flags(s) for s in chunk["status"]], dtype=np.int64)
+        else:
+            flags = np.zeros(n, dtype=np.int64)
+
+        keep = np.isfinite(power) & np.isfinite(kwh) & np.isfinite(cost)
+        if not keep.all():
+            self.skipped += int(n - keep.sum())
+            ids, ts, power, kwh, cost, flags = (col[keep] for col in (ids, ts, power, kwh, cost, flags))
+        return list(zip(ids.tolist(), ts.tolist(), power.tolist(), kwh.tolist(),
+                        cost.tolist(), flags.tolist())), n
+
+
+def _float_col(values, n):
+    if values is None:
+        return None
+    out = np.asarray(values, dtype=object)
+    out[(out == "") | (out == None)] = np.nan  # noqa: E711 (elementwise comparison)
+    return out.astype(np.float64)
+
+
+# --- Export ---
+
+def export_range(conn, path, fmt, start_ms, end_ms, appliance_id=None, chunk_size=CHUNK_SIZE):
+    """Stream [start_ms, end_ms) to a CSV, Parquet or binary record file. Returns rows written."""
+    names = dict(conn.execute("SELECT id, name FROM appliances"))
+    chunks = schema.iter_readings(conn, start_ms, end_ms, appliance_id, chunk_size)
+    written = 0
+
+    if fmt == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["appliance", "ts", "power", "kwh", "cost", "flags"])
+            for rows in chunks:
+                writer.writerows((names.get(r[0], r[0]),) + tuple(r[1:]) for r in rows)
+                written += len(rows)
+    elif fmt == "bin":
+        spool = Spool(path)
+        try:
+            for rows in chunks:
+                aid, ts, power, _, _, flags = zip(*rows)
+                spool.append(to_records(aid, ts, power, flags))
+                written += len(rows)
+        finally:
+            spool.close()
+    elif fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet support needs pyarrow: pip install pyarrow")
+        out = None
+        try:
+            for rows in chunks:
+                aid, ts, power, kwh, cost, flags = zip(*rows)
+                table = pa.table({"appliance": [names.get(a, str(a)) for a in aid], "ts": ts,
+                                  "power": power, "kwh": kwh, "cost": cost, "flags": flags})
+                out = out or pq.ParquetWriter(path, table.schema)
+                out.write_table(table)
+                written += len(rows)
+        finally:
+            if out:
+                out.close()
+    else:
+        raise ValueError(f"unknown format {fmt}")
+    return written
+
+
+def _guess_format(path):
+    for suffix, fmt in ((".csv", "csv"), (".parquet", "parquet"), (".pq", "parquet")):
+        if path.lower().endswith(suffix):
+            return fmt
+    return "bin"
+
+
+def _time_arg(value):
+    return parse_timestamp(value) if value else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import/export of WattFinder readings")
+    parser.add_argument("--db", default="wattfinder_enterprise.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="load a CSV, Parquet or binary record dump")
+    imp.add_argument("path")
+    imp.add_argument("--format", choices=sorted(READERS))
+    imp.add_argument("--chunk", type=int, default=CHUNK_SIZE)
+    imp.add_argument("--interval", type=float, help="seconds per reading, to derive kWh from power or back")
+    imp.add_argument("--tariff", help="JSON tariff file for rows without cost (default: flat 7.50/kWh)")
+    imp.add_argument("--partitioned", action="store_true", help="write into per-day tables")
+    imp.add_argument("--keep-indexes", action="store_true", help="don't drop indexes during the load")
+
+    exp = sub.add_parser("export", help="write a time range to a file")
+    exp.add_argument("path")
+    exp.add_argument("--format", choices=sorted(READERS))
+    exp.add_argument("--start", help="epoch ms or ISO local time (default: beginning)")
+    exp.add_argument("--end", help="epoch ms or ISO local time (default: now)")
+    exp.add_argument("--appliance", help="appliance name")
+    exp.add_argument("--chunk", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    conn = sqlite3.connect(args.db)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    schema.migrate(conn)
+    fmt = args.format or _guess_format(args.path)
+
+    if args.command == "import":
+        tariff = Tariff()
+        if args.tariff:
+            with open(args.tariff, encoding="utf-8") as f:
+                tariff = Tariff.from_config(json.load(f))
+        importer = Importer(conn, interval_s=args.interval, tariff=tariff, partitioned=args.partitioned)
+        total = importer.run(args.path, fmt, args.chunk, defer_indexes=not args.keep_indexes)
+        logging.info(f"Import of {args.path} complete: {total} rows read, {importer.skipped} skipped")
+    else:
+        appliance_id = None
+        if args.appliance:
+            row = conn.execute("SELECT id FROM appliances WHERE name = ?", (args.appliance,)).fetchone()
+            if row is None:
+                parser.error(f"unknown appliance {args.appliance}")
+            appliance_id = row[0]
+        end = _time_arg(args.end) or int(datetime.now().timestamp() * 1000)
+        total = export_range(conn, args.path, fmt, _time_arg(args.start) or 0, end,
+                             appliance_id, args.chunk)
+        logging.info(f"Exported {total} rows to {args.path}")
+    conn.close()
@@ -0,0 +1,137 @@
+import os
+import zlib
+import struct
+import numpy as np
+
+# One meter reading: meter id, epoch-ms timestamp, watts, flag bits (schema.FLAG_*)
+RECORD = struct.Struct("<IqfH")
+RECORD_DTYPE = np.dtype([("meter_id", "<u4"), ("ts", "<i8"), ("power", "<f4"), ("flags", "<u2")])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+# Batch frames start with a magic + version so they can't be mistaken for JSON
+FRAME_MAGIC = b"WFR\x01"
+
+
+def encode_record(meter_id, ts_ms, power, flags=0):
+    return RECORD.pack(meter_id, ts_ms, power, flags)
+
+
+def decode_record(buf):
+    return RECORD.unpack(buf)
+
+
+def to_records(meter_ids, ts_ms, power, flags=0):
+    """Pack column arrays into a RECORD_DTYPE array."""
+    records = np.empty(len(ts_ms), dtype=RECORD_DTYPE)
+    records["meter_id"] = meter_ids
+    records["ts"] = ts_ms
+    records["power"] = power
+    records["flags"] = flags
+    return records
+
+
+def encode_frame(meter_ids, ts_ms, power, flags=0):
+    """Serialize a batch of readings into one frame (MQTT payload, socket message, ...)."""
+    return FRAME_MAGIC + to_records(meter_ids, ts_ms, power, flags).tobytes()
+
+
+def is_frame(buf):
+    return bytes(buf[:len(FRAME_MAGIC)]) == FRAME_MAGIC
+
+
+def decode_frame(buf):
+    """Zero-copy RECORD_DTYPE view over a frame's records."""
+    if not is_frame(buf):
+        raise ValueError("not a WattFinder record frame")
+    body = memoryview(buf)[len(FRAME_MAGIC):]
+    if len(body) % RECORD.size:
+        raise ValueError(f"frame body is not a multiple of {RECORD.size} bytes")
+    return np.frombuffer(body, dtype=RECORD_DTYPE)
+
+
+# --- On-disk spool (raw back-to-back records, append only) ---
+
+class Spool:
+    """Append-only file of fixed-width records, e.g. to park readings while the DB is unavailable."""
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self._file = open(path, "ab")
+
+    def append(self, records):
+        self._file.write(records.tobytes())
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def read_spool(path, mmap=True):
+    """Records in a spool file. A torn trailing record from a crash is ignored."""
+    count = os.path.getsize(path) // RECORD.size
+    if count == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    if mmap:
+        return np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+    return np.fromfile(path, dtype=RECORD_DTYPE, count=count)
+
+
+# --- Column compression for cold-storage chunks ---
+#
+# Integer columns are differenced `order` times (2 = delta-of-delta, which
+# turns a steady sampling rate into a run of zeros), stored in the narrowest
+# integer type that holds the residuals, then zlib'd. Float columns are either
+# quantized to a fixed step and stored as delta integers (lossy, much smaller),
+# or XORed with the previous value's bits and byte-shuffled before zlib
+# (lossless, Gorilla-style: slowly changing values share their high bytes).
+
+_INT_HEADER = struct.Struct("<BB")  # differencing order actually applied, residual byte width
+_QUANTUM = struct.Struct("<d")
+
+
+def encode_ints(values, order=0):
+    v = np.asarray(values, dtype=np.int64)
+    seeds = []
+    for _ in range(min(order, len(v))):
+        seeds.append(v[0])
+        v = np.diff(v)
+    width = 8
+    if len(v):
+        lo, hi = v.min(), v.max()
+        width = next(w for w in (1, 2, 4, 8) if -(1 << (8 * w - 1)) <= lo and hi < 1 << (8 * w - 1))
+    return (_INT_HEADER.pack(len(seeds), width) + np.array(seeds, dtype="<i8").tobytes()
+            + zlib.compress(v.astype(f"<i{width}").tobytes()))
+
+
+def decode_ints(blob):
+    order, width = _INT_HEADER.unpack_from(blob)
+    seeds = np.frombuffer(blob, dtype="<i8", count=order, offset=_INT_HEADER.size)
+    body = zlib.decompress(blob[_INT_HEADER.size + 8 * order:])
+    v = np.frombuffer(body, dtype=f"<i{width}").astype(np.int64)
+    for seed in seeds[::-1]:
+        v = np.concatenate(([seed], seed + np.cumsum(v)))
+    return v
+
+
+def encode_floats(values, quantum=None):
+    """b"q" + step + delta-coded multiples of quantum, or b"x" + shuffled XOR bits (lossless)."""
+    values = np.asarray(values, dtype=np.float64)
+    if quantum:
+        return b"q" + _QUANTUM.pack(quantum) + encode_ints(np.rint(values / quantum), order=1)
+    bits = values.view(np.uint64)
+    xor = bits.copy()
+    xor[1:] ^= bits[:-1]
+    shuffled = xor.astype("<u8").view(np.uint8).reshape(-1, 8).T  # byte planes, most alike together
+    return b"x" + zlib.compress(shuffled.tobytes())
+
+
+def decode_floats(blob):
+    if blob[:1] == b"q":
+        (quantum,) = _QUANTUM.unpack_from(blob, 1)
+        return decode_ints(blob[1 + _QUANTUM.size:]) * quantum
+    planes = np.frombuffer(zlib.decompress(blob[1:]), dtype=np.uint8).reshape(8, -1)
+    xor = np.ascontiguousarray(planes.T).view("<u8").ravel()
+    return np.bitwise_xor.accumulate(xor).view(np.float64)
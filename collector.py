@@ -0,0 +1,108 @@
+import time
+import signal
+import logging
+import argparse
+import sqlite3
+import threading
+import schema
+from backend import (EnergyBackend, DATA_SOURCE, DB_NAME, METRICS_ENABLED, PROFILE_PATH,
+                     SAMPLE_INTERVAL, OVERRUN_POLICY, RAW_RETENTION_DAYS, COMPACT_INTERVAL)
+from read_api import ReadApi, API_HOST, API_PORT
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Seconds between status lines in the log
+STATUS_INTERVAL = 60
+
+
+def log_status(backend, started):
+    snap = backend.snapshot
+    writer = backend.writer
+    line = (f"{snap.n} meters, {snap.total_power:.0f} W now, {snap.total_kwh:.3f} kWh / "
+            f"₹{snap.total_cost:.2f} this session, {snap.total_surges} surges; "
+            f"{writer.rows_written} rows written ({writer.rows_written / max(time.monotonic() - started, 1e-9):.0f}/s), "
+            f"writer queue {writer.queue.qsize()}, dropped {writer.dropped}, failed {writer.rows_failed}")
+    if backend.source is not None:
+        stats = backend.source.stats()
+        line += f"; source queue {stats['queue_depth']}, lag {stats['last_lag_ms']} ms, dropped {stats['dropped']}"
+    logging.info(line)
+
+
+def compact(db_name, retention_days):
+    """Move raw readings past the retention window into cold storage."""
+    conn = sqlite3.connect(db_name, timeout=30)
+    try:
+        moved = schema.compact_readings(conn, int((time.time() - retention_days * 86400) * 1000))
+    finally:
+        conn.close()
+    if moved:
+        logging.info(f"Moved {moved} readings older than {retention_days:g} days to cold storage")
+
+
+def run(db_name, source_kind, status_interval=STATUS_INTERVAL, api_address=None, metrics_file=None,
+        metrics=METRICS_ENABLED, profile=PROFILE_PATH, interval=SAMPLE_INTERVAL, overrun=OVERRUN_POLICY,
+        retention_days=RAW_RETENTION_DAYS):
+    """Collect until SIGINT/SIGTERM, then flush the writer and save the session.
+
+    With api_address=(host, port) the read API is served alongside (including
+    /metrics); metrics_file is rewritten with the same metrics every status interval.
+    With retention_days, older raw readings are compacted at start and then about
+    every COMPACT_INTERVAL seconds.
+    """
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    backend = EnergyBackend(db_name=db_name, metrics=metrics, profile=profile, interval=interval, overrun=overrun)
+    api = None
+    if api_address:
+        api = ReadApi(backend, *api_address)
+        api.start()
+    backend.start_monitoring(api.notify if api else lambda: None, backend.open_source(source_kind))
+    logging.info(f"Collecting from {source_kind} into {db_name}")
+    started = time.monotonic()
+    next_compact = started
+    try:
+        while True:
+            if retention_days is not None and time.monotonic() >= next_compact:
+                compact(db_name, retention_days)
+                next_compact = time.monotonic() + COMPACT_INTERVAL
+            if stop.wait(status_interval):
+                break
+            log_status(backend, started)
+            if metrics_file and backend.metrics:
+                backend.metrics.write_textfile(metrics_file)
+    finally:
+        if api:
+            api.stop()
+        backend.stop_monitoring()
+        log_status(backend, started)
+        if metrics_file and backend.metrics:
+            backend.metrics.write_textfile(metrics_file)
+        logging.info("Collector stopped, session saved")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless WattFinder collector (no display needed)")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--source", choices=["simulator", "mqtt"], default=DATA_SOURCE)
+    parser.add_argument("--status-interval", type=float, default=STATUS_INTERVAL)
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL, help="simulator seconds per sample (>= 0.1)")
+    parser.add_argument("--overrun", choices=["skip", "catchup"], default=OVERRUN_POLICY,
+                        help="what to do with sample slots missed after a slow tick")
+    parser.add_argument("--api", action="store_true", help="serve the local read API")
+    parser.add_argument("--api-host", default=API_HOST)
+    parser.add_argument("--api-port", type=int, default=API_PORT)
+    parser.add_argument("--metrics-file", help="write Prometheus text metrics here every status interval")
+    parser.add_argument("--no-metrics", action="store_true", help="disable pipeline instrumentation")
+    parser.add_argument("--retention-days", type=float, default=RAW_RETENTION_DAYS,
+                        help="compact raw readings older than this into cold storage")
+    parser.add_argument("--no-compact", action="store_true", help="keep all readings raw")
+    parser.add_argument("--profile", default=PROFILE_PATH,
+                        help="cProfile the collector threads into PROFILE.monitor.prof / PROFILE.writer.prof")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    run(args.db, args.source, args.status_interval, (args.api_host, args.api_port) if args.api else None,
+        args.metrics_file, METRICS_ENABLED and not args.no_metrics, args.profile, args.interval, args.overrun,
+        None if args.no_compact else args.retention_days)
@@ -0,0 +1,310 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+import numpy as np
+import schema
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock
+    fcntl = None
+
+# On-disk dtype of each column; every meter has one raw file per column
+COLUMNS = {"ts": "<i8", "power": "<f4", "kwh": "<f8", "cost": "<f8", "flags": "<u1"}
+
+# Meters whose column files stay open between appends (least recently used are closed first)
+MAX_OPEN_METERS = 128
+
+# Seconds between background spills of the rows mirrored by flush_hook (the cost
+# is mostly per meter touched, so longer intervals amortize it over more rows)
+SPILL_INTERVAL = 30.0
+
+
+class ColumnStore:
+    """Append-only per-meter column files, memory-mapped for zero-copy range scans.
+
+    Each meter (by appliances.id) gets m<id>.<column> files of raw
+    little-endian values, kept in timestamp order. A manifest records how many
+    rows are committed per meter and is replaced atomically after the column
+    bytes are written, so a crash mid-append leaves at most some uncommitted
+    tail bytes, which are cut off the next time the store is opened. Readers
+    only ever see committed rows.
+
+    Readings older than a meter's newest stored timestamp (late arrivals) are
+    skipped here, keeping every file sorted; they are still in SQLite.
+
+    One process at a time owns a store: opening it takes an exclusive lock on
+    the directory (where fcntl exists), so a second opener can't trim another
+    process's uncommitted tail or overwrite its manifest. readonly=True opens
+    without the lock (e.g. next to a running collector): nothing on disk is
+    changed and only the rows committed when it was opened are visible.
+    """
+
+    def __init__(self, path, durable=False, spill_interval=SPILL_INTERVAL, readonly=False):
+        self.path = path
+        self.durable = durable  # fsync column files and manifest on every append
+        self.spill_interval = spill_interval
+        self.readonly = readonly
+        self.skipped = 0
+        os.makedirs(path, exist_ok=True)
+        self._lock_file = None if readonly else _lock_dir(path)
+        self._manifest = os.path.join(path, "manifest.json")
+        self.rows = {}
+        if os.path.exists(self._manifest):
+            with open(self._manifest, encoding="utf-8") as f:
+                self.rows = {int(k): v for k, v in json.load(f)["rows"].items()}
+        self._last_ts = {}
+        self._files = OrderedDict()
+        self._maps = {}
+        self._pending = []  # batches from flush_hook not yet appended
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._spiller = None
+        for meter_id in list(self.rows):
+            self._recover(meter_id)
+
+    def _file(self, meter_id, column):
+        return os.path.join(self.path, f"m{meter_id}.{column}")
+
+    def _recover(self, meter_id):
+        """Trim torn tails and clamp the committed count to what is fully on disk."""
+        sizes = [os.path.getsize(self._file(meter_id, c)) // np.dtype(t).itemsize
+                 if os.path.exists(self._file(meter_id, c)) else 0 for c, t in COLUMNS.items()]
+        n = self.rows[meter_id] = min([self.rows[meter_id]] + sizes)
+        if not self.readonly:
+            for column, dtype in COLUMNS.items():
+                with open(self._file(meter_id, column), "ab") as f:
+                    f.truncate(n * np.dtype(dtype).itemsize)
+        if n:
+            self._last_ts[meter_id] = int(self.column(meter_id, "ts")[-1])
+
+    # --- Writing ---
+
+    def append(self, meter_ids, ts, power, kwh, cost, flags):
+        """Append readings for any mix of meters; returns rows stored."""
+        meter_ids = np.asarray(meter_ids, dtype=np.int64)
+        if self.readonly:
+            raise RuntimeError(f"column store {self.path} was opened read-only")
+        if not len(meter_ids):
+            return 0
+        with self._write_lock:
+            return self._append(meter_ids, ts, power, kwh, cost, flags)
+
+    def _append(self, meter_ids, ts, power, kwh, cost, flags):
+        ts = np.asarray(ts, dtype=np.int64)
+        order = np.lexsort((ts, meter_ids))
+        values = {"ts": ts[order], "power": np.asarray(power)[order], "kwh": np.asarray(kwh)[order],
+                  "cost": np.asarray(cost)[order], "flags": np.asarray(flags)[order]}
+        ids = meter_ids[order]
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        bounds = np.r_[starts, len(ids)].tolist()
+
+        stored = 0
+        for meter_id, lo, hi in zip(ids[starts].tolist(), bounds[:-1], bounds[1:]):
+            last = self._last_ts.get(meter_id)
+            if last is not None:
+                lo += int(np.searchsorted(values["ts"][lo:hi], last, side="right"))
+            if lo >= hi:
+                continue
+            files = self._open(meter_id)
+            for column, dtype in COLUMNS.items():
+                files[column].write(values[column][lo:hi].astype(dtype).tobytes())
+            for f in files.values():
+                f.flush()
+                if self.durable:
+                    os.fsync(f.fileno())
+            self.rows[meter_id] = self.rows.get(meter_id, 0) + (hi - lo)
+            self._last_ts[meter_id] = int(values["ts"][hi - 1])
+            stored += hi - lo
+        self.skipped += len(ids) - stored
+        if stored:
+            self._commit()
+        return stored
+
+    def flush_hook(self, conn, rows):
+        """ReadingWriter flush hook: queue each batch of readings tuples for the spill thread.
+
+        Only a conversion to arrays happens on the writer's commit path; the
+        file writes run every spill_interval seconds on a background thread.
+        Rows still queued when the process dies are only in SQLite
+        (`column_store.py build` adds them back).
+        """
+        aid, ts, power, kwh, cost, flags = zip(*rows)
+        batch = (np.array(aid, dtype=np.int64), np.array(ts, dtype=np.int64), np.array(power, dtype=np.float64),
+                 np.nan_to_num(np.array(kwh, dtype=np.float64)), np.nan_to_num(np.array(cost, dtype=np.float64)),
+                 np.array(flags, dtype=np.int64))
+        with self._pending_lock:
+            self._pending.append(batch)
+            if self._spiller is None:
+                self._stop.clear()
+                self._spiller = threading.Thread(target=self._spill_loop, name="ColumnStore", daemon=True)
+                self._spiller.start()
+
+    def _spill_loop(self):
+        while not self._stop.wait(self.spill_interval):
+            try:
+                self.spill()
+            except OSError as e:
+                logging.error(f"Column store spill failed: {e}")
+
+    def spill(self):
+        """Append everything flush_hook has queued so far; returns rows stored."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        return self.append(*(np.concatenate(col) for col in zip(*pending)))
+
+    def _open(self, meter_id):
+        files = self._files.get(meter_id)
+        if files is not None:
+            self._files.move_to_end(meter_id)
+            return files
+        if len(self._files) >= MAX_OPEN_METERS:
+            for f in self._files.popitem(last=False)[1].values():
+                f.close()
+        files = self._files[meter_id] = {c: open(self._file(meter_id, c), "ab") for c in COLUMNS}
+        return files
+
+    def _commit(self):
+        tmp = self._manifest + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"rows": self.rows}, f)
+            if self.durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, self._manifest)
+
+    def close(self):
+        """Stop the spill thread, append what is still queued and close the column files.
+
+        The store stays usable (and locked) afterwards; the next flush_hook
+        call starts a new spill thread.
+        """
+        with self._pending_lock:
+            spiller, self._spiller = self._spiller, None
+        if spiller is not None:
+            self._stop.set()
+            spiller.join()
+        self.spill()
+        with self._write_lock:
+            for files in self._files.values():
+                for f in files.values():
+                    f.close()
+            self._files.clear()
+
+    # --- Reading (zero-copy memmap views) ---
+
+    def meters(self):
+        return sorted(m for m, n in self.rows.items() if n)
+
+    def column(self, meter_id, column):
+        """Whole committed column of a meter as a read-only memmap view."""
+        n = self.rows.get(meter_id, 0)
+        if not n:
+            return np.empty(0, dtype=COLUMNS[column])
+        cached = self._maps.get((meter_id, column))
+        if cached is None or len(cached) < n:
+            # Map the whole file so later appends are usually visible without remapping
+            size = os.path.getsize(self._file(meter_id, column)) // np.dtype(COLUMNS[column]).itemsize
+            cached = np.memmap(self._file(meter_id, column), dtype=COLUMNS[column], mode="r", shape=(size,))
+            self._maps[(meter_id, column)] = cached
+        return cached[:n]
+
+    def range(self, meter_id, start_ms, end_ms, columns=("ts", "power")):
+        """Dict of column views for start_ms <= ts < end_ms (no copies)."""
+        ts = self.column(meter_id, "ts")
+        lo, hi = np.searchsorted(ts, [start_ms, end_ms])
+        return {c: self.column(meter_id, c)[lo:hi] for c in columns}
+
+    def totals(self, start_ms, end_ms):
+        """Per-meter kWh, cost, peak and mean power over a time range."""
+        out = {}
+        for meter_id in self.meters():
+            cols = self.range(meter_id, start_ms, end_ms, ("power", "kwh", "cost"))
+            if len(cols["power"]):
+                out[meter_id] = {"kwh": float(cols["kwh"].sum()), "cost": float(cols["cost"].sum()),
+                                 "max_power": float(cols["power"].max()),
+                                 "avg_power": float(cols["power"].mean(dtype=np.float64)),
+                                 "samples": len(cols["power"])}
+        return out
+
+    def resample(self, meter_id, start_ms, end_ms, step_ms):
+        """(bucket_start, kwh, avg_power, max_power) arrays for fixed buckets aligned to step_ms.
+
+        Empty buckets are left out.
+        """
+        cols = self.range(meter_id, start_ms, end_ms, ("ts", "power", "kwh"))
+        ts, power, kwh = cols["ts"], cols["power"], cols["kwh"]
+        if not len(ts):
+            empty = np.empty(0)
+            return np.empty(0, dtype=np.int64), empty, empty, empty
+        buckets = ts - ts % step_ms
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        counts = np.diff(np.r_[starts, len(ts)])
+        return (buckets[starts], np.add.reduceat(kwh, starts),
+                np.add.reduceat(power, starts, dtype=np.float64) / counts, np.maximum.reduceat(power, starts))
+
+
+def _lock_dir(path):
+    """Exclusive lock on a store directory, held until the returned file is closed."""
+    lock_file = open(os.path.join(path, ".lock"), "a")
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(f"column store {path} is in use by another process")
+    return lock_file
+
+
+def build(store, conn, chunk_size=500_000):
+    """Load every reading in the DB (raw and cold) newer than what the store already has."""
+    start = min(store._last_ts.values(), default=-1) + 1
+    end = int(time.time() * 1000) + schema.DAY_MS
+    total = 0
+    for rows in schema.iter_readings(conn, start, end, chunk_size=chunk_size):
+        aid, ts, power, kwh, cost, flags = zip(*rows)
+        store.append(aid, ts, power, np.nan_to_num(np.array(kwh, dtype=np.float64)),
+                     np.nan_to_num(np.array(cost, dtype=np.float64)), flags)
+        total += len(rows)
+        logging.info(f"{total} readings scanned")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the memory-mapped column store")
+    parser.add_argument("--db", default="wattfinder_enterprise.db")
+    parser.add_argument("--path", help="store directory (default: <db>.columns)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="backfill the store from the database")
+    totals = sub.add_parser("totals", help="per-meter totals over the last N days")
+    totals.add_argument("--days", type=float, default=30)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        store = ColumnStore(args.path or f"{args.db}.columns", readonly=args.command != "build")
+    except RuntimeError as e:
+        parser.error(str(e))
+    if args.command == "build":
+        conn = sqlite3.connect(args.db)
+        schema.migrate(conn)
+        logging.info(f"Added {build(store, conn)} readings; {store.skipped} older than the store were skipped")
+        conn.close()
+    else:
+        end = int(time.time() * 1000)
+        started = time.perf_counter()
+        result = store.totals(end - int(args.days * schema.DAY_MS), end)
+        elapsed = time.perf_counter() - started
+        for meter_id, t in result.items():
+            print(f"{meter_id:>6} {t['kwh']:12.3f} kWh {t['cost']:12.2f} cost "
+                  f"{t['max_power']:9.1f} W peak {t['samples']:>10} samples")
+        print(f"{sum(t['samples'] for t in result.values())} samples in {elapsed * 1000:.1f} ms")
+    store.close()
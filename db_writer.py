@@ -0,0 +1,142 @@
+import sqlite3
+import threading
+import queue
+import time
+import logging
+from metrics import profiled
+from schema import READINGS_INSERT, insert_partitioned
+
+
+class ReadingWriter:
+    """Single long-lived SQLite writer that flushes readings in batches.
+
+    Producers hand over lists of row tuples with submit(); a background thread
+    drains the bounded queue and commits once per batch (by row count or time
+    window) using executemany on one WAL-mode connection. flush_hooks are
+    called as hook(conn, rows) inside the same transaction as the insert; a
+    batch whose insert or hook raises is rolled back, logged and counted in
+    batches_failed, and the writer carries on with the next one.
+    With a PipelineMetrics the insert, hook and commit times are recorded per
+    batch; with a profile path the writer thread runs under cProfile.
+    """
+
+    def __init__(self, db_name, insert_sql=READINGS_INSERT, batch_size=500,
+                 flush_interval=1.0, max_queue=10000, synchronous="NORMAL", partitioned=False, flush_hooks=(),
+                 journal_mode="WAL", metrics=None, profile=None):
+        self.db_name = db_name
+        self.insert_sql = insert_sql
+        self.partitioned = partitioned
+        self.flush_hooks = list(flush_hooks)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self.journal_mode = journal_mode
+        self.metrics = metrics
+        self.profile = profile
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.rows_written = 0
+        self.batches_written = 0
+        self.batches_failed = 0
+        self.rows_failed = 0
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()  # several producer threads may drop rows
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            if not self._stop.is_set():
+                return
+            self._thread.join()  # a timed-out stop() is still draining; never run two writers
+        self._stop.clear()
+        target = profiled(self._run, self.profile) if self.profile else self._run
+        self._thread = threading.Thread(target=target, name="ReadingWriter", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Flush everything still queued and close the connection.
+
+        If the thread has not finished within timeout it keeps draining in the
+        background; a later start() waits for it instead of starting a second writer.
+        """
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logging.warning(f"Writer still draining {self.queue.qsize()} queued batches after {timeout:g}s")
+            return
+        self._thread = None
+
+    def submit(self, rows, block=True, timeout=None):
+        """Queue a list of rows. Returns False if the queue is full and the rows were dropped."""
+        if not rows:
+            return True
+        try:
+            self.queue.put(rows, block=block, timeout=timeout)
+            return True
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += len(rows)
+            return False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        return conn
+
+    def _run(self):
+        conn = self._connect()
+        pending = []
+        deadline = time.monotonic() + self.flush_interval
+        try:
+            while True:
+                stopping = self._stop.is_set()
+                wait = max(0.0, deadline - time.monotonic())
+                try:
+                    pending.extend(self.queue.get(timeout=0 if stopping else wait))
+                    # Drain whatever else is already waiting without blocking
+                    while len(pending) < self.batch_size:
+                        pending.extend(self.queue.get_nowait())
+                except queue.Empty:
+                    pass
+
+                now = time.monotonic()
+                if pending and (len(pending) >= self.batch_size or now >= deadline or stopping):
+                    self._flush(conn, pending)
+                    pending = []
+                if now >= deadline:
+                    deadline = now + self.flush_interval
+                if stopping and not pending and self.queue.empty():
+                    break
+        finally:
+            conn.close()
+
+    def _flush(self, conn, rows):
+        m = self.metrics
+        try:
+            with conn:
+                if m:
+                    t = time.perf_counter()
+                if self.partitioned:
+                    insert_partitioned(conn, rows)
+                else:
+                    conn.executemany(self.insert_sql, rows)
+                if m:
+                    t = m.lap("db_write", t)
+                for hook in self.flush_hooks:
+                    hook(conn, rows)
+                if m:
+                    t = m.lap("rollup", t)
+            if m:
+                m.lap("commit", t)
+            self.rows_written += len(rows)
+            self.batches_written += 1
+        except Exception as e:
+            # Not just sqlite3.Error: a hook raising anything else must not kill the
+            # thread, or producers blocked in submit() would wait forever
+            self.batches_failed += 1
+            self.rows_failed += len(rows)
+            logging.error(f"Batch write of {len(rows)} rows failed: {e!r}",
+                          exc_info=not isinstance(e, sqlite3.Error))
@@ -0,0 +1,209 @@
+import numpy as np
+from schema import HOUR_MS, DAY_MS, ROLLUPS
+from rollups import query_usage
+from tariff import local_offset_ms
+
+
+class LoadForecaster:
+    """Online per-meter load forecast, projected against each meter's daily kWh goal.
+
+    profile[h, m] is a time-weighted EWMA of meter m's power during local hour
+    h and rate[h, m] its cost per kWh (hour-major, so a whole-fleet tick
+    touches one contiguous row); a slot forgets old data over memory_s
+    seconds of its own samples (a week of that hour by default). Every batch
+    folds in with a few bincounts over the whole fleet, so updates are O(1) per
+    sample and history is never rescanned. Projections add the profile over
+    the rest of the day (or month) to what was actually used so far; hours
+    not seen yet borrow the meter's average over the hours that were.
+    """
+
+    def __init__(self, memory_s=7 * 3600, warmup_s=900, alert_ratio=1.0, utc_offset_ms=None):
+        self.memory_s = memory_s
+        self.warmup_s = warmup_s        # data a meter needs before it can raise alerts
+        self.alert_ratio = alert_ratio  # alert when projection > goal * alert_ratio
+        self.utc_offset_ms = local_offset_ms() if utc_offset_ms is None else utc_offset_ms
+
+        # Per-meter state, indexed by registry meter id (last axis)
+        self.profile = np.zeros((24, 0))
+        self.rate = np.zeros((24, 0))
+        self.seen = np.zeros((24, 0), dtype=bool)
+        self.priced = np.zeros((24, 0), dtype=bool)
+        self.observed_s = np.zeros(0)
+        self.day_kwh = np.zeros(0)
+        self.day_cost = np.zeros(0)
+        self.month_kwh = np.zeros(0)
+        self.month_cost = np.zeros(0)
+        self.alerted_day = np.zeros(0, dtype=bool)
+        self.alerted_month = np.zeros(0, dtype=bool)
+        self.day = None  # local day number the day_* totals belong to
+
+    def _grow(self, n):
+        have = len(self.observed_s)
+        if n <= have:
+            return
+        n = max(n, 2 * have)  # amortized: state is reallocated O(log n) times
+        for name in ("profile", "rate", "seen", "priced", "observed_s", "day_kwh", "day_cost",
+                     "month_kwh", "month_cost", "alerted_day", "alerted_month"):
+            old = getattr(self, name)
+            new = np.zeros(old.shape[:-1] + (n,), dtype=old.dtype)
+            new[..., :have] = old
+            setattr(self, name, new)
+
+    def _local_day(self, ts_ms):
+        return (np.asarray(ts_ms, dtype=np.int64) + self.utc_offset_ms) // DAY_MS
+
+    @staticmethod
+    def _month_of(day):
+        return np.datetime64(int(day), "D").astype("datetime64[M]")
+
+    def _roll(self, day):
+        if self.day is None or self._month_of(day) != self._month_of(self.day):
+            self.month_kwh[:] = 0
+            self.month_cost[:] = 0
+            self.alerted_month[:] = False
+        self.day = day
+        self.day_kwh[:] = 0
+        self.day_cost[:] = 0
+        self.alerted_day[:] = False
+
+    def update(self, meter_ids, ts_ms, power, seconds, kwh, cost):
+        """Fold in a batch of readings (any order; seconds is the time each sample covers)."""
+        if not len(meter_ids):
+            return
+        self._grow(int(meter_ids.max()) + 1)
+        n = len(self.observed_s)
+        seconds = np.asarray(seconds, dtype=np.float64) * np.ones(len(meter_ids))
+        local = np.asarray(ts_ms, dtype=np.int64) + self.utc_offset_ms
+
+        # Hour-of-day slots touched by this batch: mean power per slot, blended in
+        # by how much time it covers
+        cells, slot = np.unique((local // HOUR_MS) % 24 * n + meter_ids, return_inverse=True)
+        t = np.bincount(slot, seconds, len(cells))
+        e = np.bincount(slot, power * seconds, len(cells))
+        k = np.bincount(slot, kwh, len(cells))
+        c = np.bincount(slot, cost, len(cells))
+        profile, rate = self.profile.reshape(-1), self.rate.reshape(-1)
+        seen, priced = self.seen.reshape(-1), self.priced.reshape(-1)
+        hit = t > 0
+        cell = cells[hit]
+        weight = np.where(seen[cell], -np.expm1(-t[hit] / self.memory_s), 1.0)
+        profile[cell] += weight * (e[hit] / t[hit] - profile[cell])
+        seen[cell] = True
+        hit = k > 0
+        cell = cells[hit]
+        weight = np.where(priced[cell], -np.expm1(-t[hit] / self.memory_s), 1.0)
+        rate[cell] += weight * (c[hit] / k[hit] - rate[cell])
+        priced[cell] = True
+        self.observed_s += np.bincount(meter_ids, seconds, n)
+
+        # Actual use so far today / this month (late readings from earlier days are left out)
+        day = local // DAY_MS
+        if self.day is None:
+            self._roll(int(day.max()))
+        for d in np.unique(day[day >= self.day]).tolist():
+            if d > self.day:
+                self._roll(d)
+            sel = day == d
+            day_kwh = np.bincount(meter_ids[sel], kwh[sel], n)
+            day_cost = np.bincount(meter_ids[sel], cost[sel], n)
+            self.day_kwh += day_kwh
+            self.day_cost += day_cost
+            self.month_kwh += day_kwh
+            self.month_cost += day_cost
+
+    def seed(self, conn, db_ids, now_ms):
+        """Warm start from the rollups: today's and this month's use, and recent hourly profiles.
+
+        db_ids maps registry meter id -> appliances.id. One bounded query per
+        total plus one over memory_s worth of hour rollups; raw readings are not read.
+        """
+        self._grow(len(db_ids))
+        n = len(self.observed_s)
+        index = {aid: i for i, aid in enumerate(np.asarray(db_ids).tolist()) if aid}
+        day = int(self._local_day(now_ms))
+        self._roll(day)
+        day_start = day * DAY_MS - self.utc_offset_ms
+        month_start = int(self._month_of(day).astype("datetime64[ms]").astype(np.int64)) - self.utc_offset_ms
+        for start, kwh_arr, cost_arr in ((day_start, self.day_kwh, self.day_cost),
+                                         (month_start, self.month_kwh, self.month_cost)):
+            for aid, usage in query_usage(conn, start, now_ms).items():
+                if aid in index:
+                    kwh_arr[index[aid]] = usage["kwh"]
+                    cost_arr[index[aid]] = usage["cost"]
+
+        hour_table = ROLLUPS[1][0]
+        since = now_ms - int(self.memory_s / 3600 * DAY_MS)
+        rows = conn.execute(f'''SELECT appliance_id, bucket, kwh, cost, sum_power, samples FROM {hour_table}
+                                WHERE bucket >= ? AND samples > 0''', (since,)).fetchall()
+        rows = [r for r in rows if r[0] in index]
+        if not rows:
+            return
+        aid, bucket, kwh, cost, sum_power, samples = (np.array(col) for col in zip(*rows))
+        ids = np.array([index[a] for a in aid.tolist()])
+        cell = ((bucket + self.utc_offset_ms) // HOUR_MS) % 24 * n + ids
+        count = np.bincount(cell, samples, n * 24)
+        filled = count > 0
+        self.profile.reshape(-1)[filled] = np.bincount(cell, sum_power, n * 24)[filled] / count[filled]
+        self.seen.reshape(-1)[filled] = True
+        k = np.bincount(cell, kwh, n * 24)
+        self.rate.reshape(-1)[k > 0] = np.bincount(cell, cost, n * 24)[k > 0] / k[k > 0]
+        self.priced.reshape(-1)[k > 0] = True
+        self.observed_s += np.bincount(ids, np.ones(len(ids)), n) * 3600
+
+    def project(self, now_ms, goals):
+        """Projected kWh/cost for today and this month per meter, with goals (daily kWh) scaled to match."""
+        n = len(goals)
+        self._grow(n)
+        profile = _fill_unseen(self.profile[:, :n], self.seen[:, :n])
+        rate = _fill_unseen(self.rate[:, :n], self.priced[:, :n])
+        local = now_ms + self.utc_offset_ms
+        hour, into = (local // HOUR_MS) % 24, (local % HOUR_MS) / HOUR_MS
+        remaining = np.zeros(24)  # hours of each slot still ahead today
+        remaining[hour] = 1 - into
+        remaining[hour + 1:] = 1
+
+        rest_kwh = remaining @ profile / 1000
+        rest_cost = remaining @ (profile * rate) / 1000
+        day_kwh, day_cost = self.day_kwh[:n], self.day_cost[:n]
+        day = int(local // DAY_MS)
+        month = self._month_of(day)
+        days_in_month = int(((month + 1).astype("datetime64[D]") - month.astype("datetime64[D]")).astype(int))
+        days_after = int(((month + 1).astype("datetime64[D]") - np.datetime64(day, "D")).astype(int)) - 1
+        return {
+            "ts": now_ms,
+            "day_kwh": day_kwh.copy(),
+            "day_projected_kwh": day_kwh + rest_kwh,
+            "day_projected_cost": day_cost + rest_cost,
+            "month_kwh": self.month_kwh[:n].copy(),
+            "month_projected_kwh": self.month_kwh[:n] + rest_kwh + days_after * profile.sum(axis=0) / 1000,
+            "month_projected_cost": self.month_cost[:n] + rest_cost
+                                    + days_after * (profile * rate).sum(axis=0) / 1000,
+            "goal_day_kwh": np.asarray(goals, dtype=np.float64).copy(),
+            "goal_month_kwh": np.asarray(goals, dtype=np.float64) * days_in_month,
+        }
+
+    def check(self, now_ms, goals):
+        """Project and return (forecast, alerts) for meters newly expected to exceed their goal.
+
+        Each meter alerts at most once per day for the daily goal and once per
+        month for the monthly one, and only after warmup_s of data.
+        """
+        forecast = self.project(now_ms, goals)
+        n = len(goals)
+        ready = (forecast["goal_day_kwh"] > 0) & (self.observed_s[:n] >= self.warmup_s)
+        alerts = []
+        for period, flags in (("day", self.alerted_day), ("month", self.alerted_month)):
+            projected, goal = forecast[f"{period}_projected_kwh"], forecast[f"goal_{period}_kwh"]
+            breach = ready & ~flags[:n] & (projected > goal * self.alert_ratio)
+            flags[:n] |= breach
+            alerts += [{"meter": int(i), "period": period, "projected_kwh": float(projected[i]),
+                        "goal_kwh": float(goal[i]), "used_kwh": float(forecast[f"{period}_kwh"][i])}
+                       for i in np.flatnonzero(breach)]
+        return forecast, alerts
+
+
+def _fill_unseen(values, seen):
+    """Unseen slots take the meter's mean over its seen slots (0 for meters never seen)."""
+    counts = seen.sum(axis=0)
+    means = np.where(counts > 0, (values * seen).sum(axis=0) / np.maximum(counts, 1), 0.0)
+    return np.where(seen, values, means)
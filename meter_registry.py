@@ -0,0 +1,156 @@
+import json
+import sqlite3
+import threading
+import numpy as np
+from schema import FLAG_SURGE, FLAG_STANDBY
+
+STATUS_STANDBY = 0
+STATUS_NORMAL = 1
+STATUS_SURGE = 2
+STATUS_LABELS = np.array(["Standby", "Normal", "⚠️ SURGE"], dtype=object)
+STATUS_FLAGS = np.array([FLAG_STANDBY, 0, FLAG_SURGE], dtype=np.int64)
+
+DEFAULT_ICON = "🔌"
+
+
+def hours_mask(active):
+    """Turn a list of inclusive (start, end) hour windows into a 24-slot bool mask."""
+    mask = np.zeros(24, dtype=bool)
+    if not active:
+        mask[:] = True
+        return mask
+    for start, end in active:
+        mask[start:end + 1] = True
+    return mask
+
+
+def status_from_flags(flags, power):
+    """Status codes for externally reported readings."""
+    return np.where(flags & FLAG_SURGE, STATUS_SURGE,
+                    np.where((flags & FLAG_STANDBY) | (power == 0), STATUS_STANDBY, STATUS_NORMAL)).astype(np.int8)
+
+
+class MeterRegistry:
+    """Runtime registry of meters. Per-meter parameters live in NumPy arrays indexed by meter id."""
+
+    def __init__(self, capacity=16):
+        self.names = []
+        self.index = {}
+        self.configs = {}
+        self.count = 0
+        self._lock = threading.Lock()
+        self._capacity = 0
+        self._range_lo = np.zeros(0)
+        self._range_hi = np.zeros(0)
+        self._surge_factor = np.ones(0)
+        self._surge_prob = np.zeros(0)
+        self._goal = np.zeros(0)
+        self._active = np.zeros((0, 24), dtype=bool)
+        self._db_id = np.zeros(0, dtype=np.int64)
+        self._grow(capacity)
+
+    @classmethod
+    def from_config(cls, config):
+        registry = cls(capacity=max(16, len(config)))
+        registry.register_many(config)
+        return registry
+
+    @classmethod
+    def from_db(cls, db_name):
+        registry = cls()
+        with sqlite3.connect(db_name) as conn:
+            registry.load_from_db(conn)
+        return registry
+
+    # --- Registration ---
+
+    def register(self, name, cfg):
+        """Add a meter (or return the id of an existing one)."""
+        with self._lock:
+            if name in self.index:
+                return self.index[name]
+            if self.count == self._capacity:
+                self._grow(self._capacity * 2)
+            i = self.count
+            self._range_lo[i], self._range_hi[i] = cfg['range']
+            self._surge_factor[i] = cfg.get('surge', 1.0)
+            self._surge_prob[i] = cfg.get('prob', 0.0)
+            self._goal[i] = cfg.get('goal', 0.0)
+            self._active[i] = hours_mask(cfg.get('active'))
+            self.names.append(name)
+            self.index[name] = i
+            self.configs[name] = dict(cfg, icon=cfg.get('icon', DEFAULT_ICON))
+            self.count = i + 1
+            return i
+
+    def register_many(self, config):
+        return [self.register(name, cfg) for name, cfg in config.items()]
+
+    def _grow(self, capacity):
+        def grow(arr, fill):
+            out = np.full((capacity,) + arr.shape[1:], fill, dtype=arr.dtype)
+            out[:len(arr)] = arr
+            return out
+
+        self._range_lo = grow(self._range_lo, 0.0)
+        self._range_hi = grow(self._range_hi, 0.0)
+        self._surge_factor = grow(self._surge_factor, 1.0)
+        self._surge_prob = grow(self._surge_prob, 0.0)
+        self._goal = grow(self._goal, 0.0)
+        self._active = grow(self._active, True)
+        self._db_id = grow(self._db_id, 0)
+        self._capacity = capacity
+
+    # --- Array views (length == count) ---
+
+    @property
+    def range_lo(self):
+        return self._range_lo[:self.count]
+
+    @property
+    def range_hi(self):
+        return self._range_hi[:self.count]
+
+    @property
+    def surge_factor(self):
+        return self._surge_factor[:self.count]
+
+    @property
+    def surge_prob(self):
+        return self._surge_prob[:self.count]
+
+    @property
+    def goal(self):
+        return self._goal[:self.count]
+
+    @property
+    def active(self):
+        return self._active[:self.count]
+
+    @property
+    def db_id(self):
+        """appliances.id of each meter (0 until the meter has been saved)."""
+        return self._db_id[:self.count]
+
+    # --- Persistence ---
+
+    def save_to_db(self, conn, names=None):
+        """Insert meters into the appliances table and record their row ids."""
+        names = self.names if names is None else names
+        rows = [(json.dumps(self.configs[name]), name) for name in names]
+        # Rows created by a legacy migration have no config yet
+        conn.executemany("UPDATE appliances SET config = ? WHERE name = ? AND config IS NULL", rows)
+        conn.executemany("INSERT OR IGNORE INTO appliances (config, name) VALUES (?, ?)", rows)
+        self._load_db_ids(conn)
+
+    def load_from_db(self, conn):
+        for name, config in conn.execute("SELECT name, config FROM appliances ORDER BY id"):
+            if config:
+                self.register(name, json.loads(config))
+        self._load_db_ids(conn)
+
+    def _load_db_ids(self, conn):
+        for db_id, name in conn.execute("SELECT id, name FROM appliances"):
+            i = self.index.get(name)
+            if i is not None:
+                self._db_id[i] = db_id
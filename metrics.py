@@ -0,0 +1,152 @@
+import os
+import bisect
+import cProfile
+import threading
+import time
+
+# Default latency buckets in seconds (upper bounds, Prometheus style)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Finer buckets for pipeline stages, which mostly take well under a millisecond
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Seconds over which rows_per_second is averaged
+RATE_WINDOW = 5.0
+
+
+class Histogram:
+    """Fixed-bucket histogram of observed values (e.g. latencies in seconds)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += value
+
+    def quantile(self, q):
+        """Approximate quantile: upper bound of the bucket holding the q-th observation."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum": self.total,
+                "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+            }
+
+
+class PipelineMetrics:
+    """Hot-path timings and gauges for the collection pipeline, in Prometheus text format.
+
+    Producers bracket each stage with perf_counter() and call lap(); callers
+    hold None instead of an instance when metrics are disabled, so the only
+    cost left on the hot path is an `if metrics:` test. Gauges and counters
+    owned by other objects (queue depths, writer totals) are registered as
+    callables and only evaluated when rendered.
+    """
+
+    STAGES = ("simulate", "accumulate", "enqueue", "db_write", "rollup", "commit", "ui_callback")
+
+    def __init__(self, prefix="wattfinder"):
+        self.prefix = prefix
+        self.stages = {stage: Histogram(STAGE_BUCKETS) for stage in self.STAGES}
+        self.tick_lag = Histogram(STAGE_BUCKETS)
+        self.tick_drift = 0.0  # schedule time lost since start: skipped slots plus current lag
+        self.rows = 0
+        self.rows_per_second = 0.0
+        self._rate_start = time.perf_counter()
+        self._rate_rows = 0
+        self._callbacks = []
+
+    def lap(self, stage, start):
+        """Record the time since start against a stage; returns now, the next stage's start."""
+        now = time.perf_counter()
+        self.stages[stage].observe(now - start)
+        return now
+
+    def count_rows(self, n):
+        self.rows += n
+        now = time.perf_counter()
+        if now - self._rate_start >= RATE_WINDOW:
+            self.rows_per_second = (self.rows - self._rate_rows) / (now - self._rate_start)
+            self._rate_start, self._rate_rows = now, self.rows
+
+    def tick(self, lag, drift):
+        self.tick_lag.observe(max(lag, 0.0))
+        self.tick_drift = drift
+
+    def register(self, name, kind, help, fn):
+        """Expose fn() as a 'gauge' or 'counter' evaluated at render time."""
+        self._callbacks.append((name, kind, help, fn))
+
+    def render(self):
+        p = self.prefix
+        lines = [f"# HELP {p}_stage_seconds Time spent in each collection pipeline stage",
+                 f"# TYPE {p}_stage_seconds histogram"]
+        for stage, hist in self.stages.items():
+            lines += _histogram_lines(f"{p}_stage_seconds", hist, f'stage="{stage}",')
+        lines += [f"# HELP {p}_tick_lag_seconds How late each tick started against its schedule",
+                  f"# TYPE {p}_tick_lag_seconds histogram"]
+        lines += _histogram_lines(f"{p}_tick_lag_seconds", self.tick_lag, "")
+        values = [("tick_drift_seconds", "gauge", "Schedule time lost since start: skipped slots times the interval plus the current tick lag", self.tick_drift),
+                  ("rows_ingested_total", "counter", "Readings accounted by the backend", self.rows),
+                  ("rows_per_second", "gauge", f"Readings per second over the last {RATE_WINDOW:g} s",
+                   self.rows_per_second)]
+        values += [(name, kind, help, fn()) for name, kind, help, fn in self._callbacks]
+        for name, kind, help, value in values:
+            lines += [f"# HELP {p}_{name} {help}", f"# TYPE {p}_{name} {kind}", f"{p}_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Atomically write render() to path (node_exporter textfile collector format)."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+
+def _histogram_lines(name, hist, labels):
+    snap = hist.snapshot()
+    lines = []
+    cumulative = 0
+    for bound, n in snap["buckets"].items():
+        cumulative += n
+        lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+    labels = labels.rstrip(",")
+    suffix = f"{{{labels}}}" if labels else ""
+    lines += [f"{name}_sum{suffix} {snap['sum']}", f"{name}_count{suffix} {snap['count']}"]
+    return lines
+
+
+def profiled(target, path):
+    """Wrap a thread target so it runs under cProfile and dumps its stats to path on exit.
+
+    cProfile only sees the thread it was enabled in, so each thread gets its own
+    file; open them with `python -m pstats` or snakeviz.
+    """
+    def run(*args, **kwargs):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return target(*args, **kwargs)
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+    return run
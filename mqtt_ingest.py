@@ -0,0 +1,194 @@
+import os
+import json
+import queue
+import time
+import logging
+import numpy as np
+from schema import FLAG_SURGE, FLAG_STANDBY
+from codec import RECORD, RECORD_DTYPE, is_frame, decode_frame, to_records
+
+# Readings must carry a timestamp (epoch ms) in (0, MAX_TS_MS) and finite power
+MAX_TS_MS = 32_503_680_000_000  # year 3000
+
+
+class MqttSettings:
+    """Broker connection settings. Defaults can be overridden with WATTFINDER_MQTT_* env vars."""
+
+    def __init__(self, host=None, port=None, topic=None, username=None, password=None,
+                 client_id="", keepalive=60, qos=0):
+        self.host = host or os.environ.get("WATTFINDER_MQTT_HOST", "localhost")
+        self.port = int(port or os.environ.get("WATTFINDER_MQTT_PORT", 1883))
+        # Meter name is the topic level matched by '+'
+        self.topic = topic or os.environ.get("WATTFINDER_MQTT_TOPIC", "wattfinder/meters/+/power")
+        self.username = username or os.environ.get("WATTFINDER_MQTT_USER")
+        self.password = password or os.environ.get("WATTFINDER_MQTT_PASSWORD")
+        self.client_id = client_id
+        self.keepalive = keepalive
+        self.qos = qos
+
+    def meter_from_topic(self, topic):
+        """Pull the meter name out of a topic matching the '+' in the subscription."""
+        pattern = self.topic.split("/")
+        parts = topic.split("/")
+        if len(parts) != len(pattern):
+            return None
+        for want, got in zip(pattern, parts):
+            if want == "+":
+                return got
+        return None
+
+
+def decode_payload(payload, meter_id):
+    """Decode one meter message into a RECORD_DTYPE array stamped with meter_id.
+
+    Accepts JSON like {"power": 812.5, "ts": 1732512000000, "surge": false},
+    a single binary RECORD, or a codec frame carrying a burst of records.
+    The topic decides the meter, so meter ids inside binary records are ignored.
+    Raises ValueError for a non-finite power or a ts that isn't an integer
+    epoch-ms value in range (a frame is rejected as a whole).
+    """
+    if is_frame(payload):
+        records = decode_frame(payload).copy()
+    elif len(payload) == RECORD.size and not payload.startswith(b"{"):
+        records = np.frombuffer(payload, dtype=RECORD_DTYPE).copy()
+    else:
+        data = json.loads(payload)
+        flags = 0
+        if data.get("surge"):
+            flags |= FLAG_SURGE
+        if data.get("standby"):
+            flags |= FLAG_STANDBY
+        ts_ms = data.get("ts") or int(time.time() * 1000)
+        if isinstance(ts_ms, float) and ts_ms.is_integer():
+            ts_ms = int(ts_ms)
+        if type(ts_ms) is not int or not 0 < ts_ms < MAX_TS_MS:
+            raise ValueError(f"bad timestamp {ts_ms!r}")
+        records = to_records([meter_id], [ts_ms], [float(data["power"])], [flags])
+    if not (np.isfinite(records["power"]).all() and ((records["ts"] > 0) & (records["ts"] < MAX_TS_MS)).all()):
+        raise ValueError("non-finite power or out-of-range timestamp")
+    records["meter_id"] = meter_id
+    return records
+
+
+class MqttIngest:
+    """MQTT source for EnergyBackend.
+
+    The paho network thread decodes each message into codec records and puts
+    them on a bounded queue; the backend drains it in batches. When
+    the queue is full the message is either dropped (block_timeout=0) or the
+    network thread waits up to block_timeout seconds, which pushes back on the
+    broker through TCP flow control. With a codec.Spool, overflow is parked
+    on disk instead of being dropped. Spooled records carry appliances.id
+    (mapped with db_id), so a spool file can be loaded later with
+    `bulk_io.py import <spool> --format bin`.
+    """
+
+    def __init__(self, settings, resolve, max_queue=100000, block_timeout=0.0, spool=None, db_id=None):
+        if spool is not None and db_id is None:
+            raise ValueError("spooling needs db_id to map meter ids to appliances.id")
+        self.settings = settings
+        self.resolve = resolve  # meter name -> meter id (or None to ignore)
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.block_timeout = block_timeout
+        self.spool = spool
+        self.db_id = db_id  # meter id array -> appliances.id array, e.g. lambda ids: registry.db_id[ids]
+        self.client = None
+
+        # Counters
+        self.received = 0
+        self.decode_errors = 0
+        self.unknown_meters = 0
+        self.dropped = 0
+        self.spooled = 0
+        self.drained = 0
+        self.last_lag_ms = 0
+        self.max_lag_ms = 0
+
+    def start(self):
+        import paho.mqtt.client as mqtt
+
+        s = self.settings
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=s.client_id,
+                                  protocol=mqtt.MQTTv5)
+        if s.username:
+            self.client.username_pw_set(s.username, s.password)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.client.connect(s.host, s.port, s.keepalive)
+        self.client.loop_start()
+        logging.info(f"MQTT ingest connecting to {s.host}:{s.port} ({s.topic})")
+
+    def stop(self):
+        if self.client:
+            self.client.loop_stop()
+            self.client.disconnect()
+            self.client = None
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        logging.info(f"Connected to MQTT broker with code {reason_code}")
+        client.subscribe(self.settings.topic, qos=self.settings.qos)
+
+    def _on_message(self, client, userdata, msg):
+        self.received += 1
+        name = self.settings.meter_from_topic(msg.topic)
+        meter_id = self.resolve(name) if name else None
+        if meter_id is None:
+            self.unknown_meters += 1
+            return
+        try:
+            records = decode_payload(msg.payload, meter_id)
+        except (ValueError, KeyError, TypeError, AttributeError, OverflowError):
+            self.decode_errors += 1
+            return
+        self.put(records)
+
+    def put(self, records):
+        """Queue a RECORD_DTYPE array (one queue slot per message, however many records)."""
+        try:
+            if self.block_timeout > 0:
+                self.queue.put(records, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(records)
+        except queue.Full:
+            if self.spool is not None:
+                records = records.copy()
+                records["meter_id"] = self.db_id(records["meter_id"])
+                self.spool.append(records)
+                self.spooled += len(records)
+            else:
+                self.dropped += len(records)
+
+    def drain(self, max_items, timeout):
+        """Wait up to timeout for readings, then return about max_items as column arrays (or None)."""
+        try:
+            chunks = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return None
+        count = len(chunks[0])
+        try:
+            while count < max_items:
+                chunks.append(self.queue.get_nowait())
+                count += len(chunks[-1])
+        except queue.Empty:
+            pass
+
+        records = np.concatenate(chunks)
+        ts = records["ts"].astype(np.int64)
+        self.drained += len(records)
+        self.last_lag_ms = int(time.time() * 1000) - int(ts.min())
+        self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+        return (records["meter_id"].astype(np.int64), ts,
+                records["power"].astype(np.float64), records["flags"].astype(np.int64))
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "drained": self.drained,
+            "dropped": self.dropped,
+            "spooled": self.spooled,
+            "decode_errors": self.decode_errors,
+            "unknown_meters": self.unknown_meters,
+            "queue_depth": self.queue.qsize(),
+            "last_lag_ms": self.last_lag_ms,
+            "max_lag_ms": self.max_lag_ms,
+        }
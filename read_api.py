@@ -0,0 +1,317 @@
+import json
+import time
+import queue
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+from rollups import query_usage, query_series
+from surge_detector import query_events
+
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+API_READ_CONNECTIONS = 4   # shared read-only SQLite connections for every client
+API_CACHE_SIZE = 256       # DB query responses kept until the writer commits again
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+API_HEARTBEAT = 15.0       # seconds between keep-alive comments on idle event streams
+API_HISTORY_POINTS = 1000  # history is decimated to about this many points per meter
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ReadApi:
+    """Local HTTP read API over a running EnergyBackend.
+
+    Live data (latest readings, ring-buffer history) is served from the
+    current FleetSnapshot and never touches SQLite. Rollup and surge event
+    queries share a small pool of read-only connections, and their responses
+    are cached until the writer commits its next batch, so many dashboards
+    polling the same view cost one query per flush. Every response carries
+    an ETag and honours If-None-Match; /api/stream pushes each new snapshot
+    as Server-Sent Events, and /metrics serves the backend's pipeline
+    metrics in Prometheus text format.
+    """
+
+    def __init__(self, backend, host=API_HOST, port=API_PORT, connections=API_READ_CONNECTIONS):
+        self.backend = backend
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.api = self
+        self._pool = queue.Queue()
+        for _ in range(connections):
+            conn = sqlite3.connect(f"file:{backend.db_name}?mode=ro", uri=True, check_same_thread=False)
+            self._pool.put(conn)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._thread = None
+        self.running = False
+
+        self.routes = {
+            "/api/latest": self.latest,
+            "/api/meters": self.meters,
+            "/api/history": self.history,
+            "/api/usage": self.usage,
+            "/api/series": self.series,
+            "/api/surges": self.surges,
+            "/api/forecast": self.forecast,
+        }
+
+    @property
+    def address(self):
+        return self.server.server_address
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="ReadApi", daemon=True)
+        self._thread.start()
+        logging.info(f"Read API listening on http://{self.address[0]}:{self.address[1]}")
+
+    def stop(self):
+        self.running = False
+        self.server.shutdown()
+        self.server.server_close()
+        self.notify()  # wake event streams so they notice the shutdown
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+    def notify(self):
+        """Call after each backend tick (e.g. as, or from, the update_callback)."""
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait_for_change(self, version, timeout):
+        """Block until the snapshot version differs from version (or timeout). Returns the snapshot."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.backend.snapshot.version != version, timeout)
+        return self.backend.snapshot
+
+    # --- Views: each returns (etag, payload) ---
+
+    def latest(self, params):
+        snap = self.backend.snapshot
+        return f"v{snap.version}", self._latest_payload(snap)
+
+    def meters(self, params):
+        registry = self.backend.registry
+        names = registry.names[:registry.count]
+        return f"m{len(names)}", {"meters": [{"name": name, "config": registry.configs[name]} for name in names]}
+
+    def forecast(self, params):
+        forecast, names = self.backend.forecast, self.backend.registry.names
+        if forecast is None:
+            return "f0", {"ts": None, "meters": {}, "alerts": []}
+        meters = {name: {key: float(values[i]) for key, values in forecast.items() if key != "ts"}
+                  for i, name in enumerate(names[:len(forecast["goal_day_kwh"])])}
+        return f"f{forecast['ts']}-{len(self.backend.alerts)}", {
+            "ts": forecast["ts"], "meters": meters, "alerts": list(self.backend.alerts)}
+
+    def _latest_payload(self, snap):
+        return {
+            "version": snap.version,
+            "timestamp": snap.timestamp.isoformat() if snap.timestamp else None,
+            "total_power": snap.total_power, "total_kwh": snap.total_kwh,
+            "total_cost": snap.total_cost, "total_surges": snap.total_surges,
+            "meters": snap.latest_readings(),
+            "surges": snap.surge_count(),
+        }
+
+    def history(self, params):
+        snap = self.backend.snapshot
+        last = _int(params, "last", None)
+        points = _int(params, "points", API_HISTORY_POINTS)
+        names = snap.meter_names()
+        wanted = set(params["meter"]) if "meter" in params else None
+        data = snap.history(last)
+        step = max(1, -(-data.shape[1] // max(points, 1)))
+        series = {name: row[::step].tolist() for name, row in zip(names, data)
+                  if wanted is None or name in wanted}
+        return f"v{snap.version}-{last}-{points}-{params.get('meter')}", {
+            "version": snap.version, "step": step, "series": series}
+
+    def usage(self, params):
+        def run(conn):
+            start, end = _range(params)
+            usage = query_usage(conn, start, end, self._appliance(conn, params))
+            names = self._names(conn)
+            return {"start": start, "end": end,
+                    "appliances": {names.get(aid, str(aid)): u for aid, u in usage.items()}}
+        return self._cached(params, "usage", run)
+
+    def series(self, params):
+        def run(conn):
+            start, end = _range(params)
+            step = _int(params, "step", 3_600_000)
+            try:
+                rows = query_series(conn, start, end, step, self._appliance(conn, params))
+            except ValueError as e:
+                raise ApiError(400, str(e))
+            names = self._names(conn)
+            keys = ("appliance", "bucket", "kwh", "cost", "max_power", "avg_power", "surges")
+            return {"start": start, "end": end, "step": step,
+                    "items": [dict(zip(keys, (names.get(r[0], str(r[0])),) + r[1:])) for r in rows]}
+        return self._cached(params, "series", run)
+
+    def surges(self, params):
+        """Newest first. Pass the returned 'next' cursor as ?cursor= to get the following page."""
+        def run(conn):
+            limit = max(1, min(_int(params, "limit", API_PAGE_SIZE), API_MAX_PAGE_SIZE))
+            start = _int(params, "start", 0)
+            end = _int(params, "end", int(time.time() * 1000) + 1)
+            before = None
+            if "cursor" in params:
+                try:
+                    ts, aid = params["cursor"][0].split(":")
+                    before = (int(ts), int(aid))
+                except ValueError:
+                    raise ApiError(400, "bad cursor")
+            rows = query_events(conn, start, end, self._appliance(conn, params), limit + 1, before)
+            names = self._names(conn)
+            keys = ("appliance", "start_ts", "end_ts", "peak_power", "baseline", "zscore", "samples")
+            items = [dict(zip(keys, (names.get(r[0], str(r[0])),) + r[1:])) for r in rows[:limit]]
+            last = rows[limit - 1] if len(rows) > limit else None
+            return {"items": items, "next": f"{last[1]}:{last[0]}" if last else None}
+        return self._cached(params, "surges", run)
+
+    # --- Helpers ---
+
+    def _cached(self, params, view, run):
+        """Run a DB-backed view, memoized until the writer's next commit."""
+        data_version = self.backend.writer.batches_written
+        key = (view, tuple(sorted((k, tuple(v)) for k, v in params.items())))
+        with self._cache_lock:
+            hit = self._cache.get(key)
+            if hit and hit[0] == data_version:
+                self._cache.move_to_end(key)
+                return hit[1], hit[2]
+
+        conn = self._pool.get()
+        try:
+            payload = run(conn)
+        finally:
+            self._pool.put(conn)
+        etag = f"d{data_version}-" + hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+        with self._cache_lock:
+            self._cache[key] = (data_version, etag, payload)
+            while len(self._cache) > API_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return etag, payload
+
+    def _names(self, conn):
+        reg = self.backend.registry
+        names = dict(zip(reg.db_id.tolist(), reg.names))
+        if len(names) < reg.count or 0 in names:
+            names.update(conn.execute("SELECT id, name FROM appliances"))
+        return names
+
+    def _appliance(self, conn, params):
+        if "appliance" not in params:
+            return None
+        name = params["appliance"][0]
+        row = conn.execute("SELECT id FROM appliances WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise ApiError(404, f"unknown appliance {name}")
+        return row[0]
+
+
+def _int(params, key, default):
+    if key not in params:
+        return default
+    try:
+        return int(params[key][0])
+    except ValueError:
+        raise ApiError(400, f"{key} must be an integer")
+
+
+def _range(params):
+    end = _int(params, "end", int(time.time() * 1000))
+    start = _int(params, "start", end - 86_400_000)
+    if start >= end:
+        raise ApiError(400, "start must be before end")
+    return start, end
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _encode(payload):
+    return json.dumps(payload, default=_json_default, ensure_ascii=False).encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logging.debug("API %s - " + format, self.address_string(), *args)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        api = self.server.api
+        params = parse_qs(url.query)
+        if url.path == "/api/stream":
+            return self._stream(api)
+        if url.path == "/metrics":
+            return self._metrics(api)
+        view = api.routes.get(url.path)
+        if view is None:
+            return self._send(404, _encode({"error": f"no such endpoint {url.path}",
+                                            "endpoints": sorted(api.routes) + ["/api/stream", "/metrics"]}))
+        try:
+            etag, payload = view(params)
+        except ApiError as e:
+            return self._send(e.status, _encode({"error": str(e)}))
+        etag = f'"{etag}"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, b"", etag)
+        self._send(200, _encode(payload), etag)
+
+    def _send(self, status, body, etag=None, content_type="application/json; charset=utf-8"):
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _metrics(self, api):
+        metrics = api.backend.metrics
+        if metrics is None:
+            return self._send(404, _encode({"error": "metrics are disabled"}))
+        self._send(200, metrics.render().encode("utf-8"), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+    def _stream(self, api):
+        """Server-Sent Events: one 'snapshot' event per new backend version."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        version = None
+        try:
+            while api.running:
+                snap = api.wait_for_change(version, API_HEARTBEAT)
+                if snap.version == version:
+                    self.wfile.write(b": keep-alive\n\n")
+                else:
+                    version = snap.version
+                    data = _encode(api._latest_payload(snap))
+                    self.wfile.write(b"id: %d\nevent: snapshot\ndata: %s\n\n" % (version, data))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
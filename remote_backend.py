@@ -0,0 +1,181 @@
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from urllib.parse import urlencode
+from urllib.request import urlopen
+import numpy as np
+from backend import HISTORY_WINDOW, FORECAST_INTERVAL, insights_summary
+from meter_registry import MeterRegistry, STATUS_LABELS
+from read_api import API_HEARTBEAT
+from snapshot import FleetSnapshot
+
+# Seconds to wait for a collector to answer, and between reconnect attempts
+REMOTE_TIMEOUT = 2.0
+REMOTE_RETRY = 5.0
+
+# Extra history samples asked for per update, covering ticks published while the request was in flight
+HISTORY_SLACK = 8
+
+_STATUS_CODES = {label: code for code, label in enumerate(STATUS_LABELS)}
+
+
+class RemoteBackend:
+    """Read-only stand-in for EnergyBackend that mirrors a running collector through its read API.
+
+    Lets the dashboard follow `collector.py --api` instead of collecting
+    itself, so the collector stays the only process simulating or ingesting
+    and writing the DB. /api/stream pushes one snapshot per tick; each becomes
+    a FleetSnapshot, the graph history is topped up with /api/history?last=
+    (only the new samples) and the forecast is refreshed every
+    FORECAST_INTERVAL seconds. Constructing it raises OSError if no collector
+    answers at url.
+    """
+
+    def __init__(self, url, timeout=REMOTE_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.registry = MeterRegistry()
+        self._load_meters()
+        self.snapshot = FleetSnapshot.empty(self.registry.names)
+        self.forecast = None
+        self.running = False
+        self._history = np.zeros((self.registry.count, 0))
+        self._history_version = None
+        self._next_forecast = 0.0
+        self._stream = None
+        self._thread = None
+
+    def _get(self, path, **params):
+        query = f"?{urlencode(params)}" if params else ""
+        with urlopen(f"{self.url}{path}{query}", timeout=self.timeout) as response:
+            return json.load(response)
+
+    def _load_meters(self):
+        for meter in self._get("/api/meters")["meters"]:
+            self.registry.register(meter["name"], meter["config"])
+
+    # --- EnergyBackend interface used by the dashboard ---
+
+    def open_source(self, kind=None):
+        return None  # the collector owns the data source
+
+    def start_monitoring(self, update_callback, source=None):
+        """Follow the collector's event stream, calling update_callback after each snapshot."""
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._follow, args=(update_callback,),
+                                        name="RemoteBackend", daemon=True)
+        self._thread.start()
+
+    def stop_monitoring(self):
+        """Stop following; the collector keeps running. Never blocks on the stream thread."""
+        self.running = False
+        stream = self._stream
+        if stream is not None:
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+    def get_history_data(self, last=None):
+        history = self._history
+        if last is not None:
+            history = history[:, -last:]
+        return dict(zip(self.registry.names[:len(history)], history))
+
+    def get_insights_summary(self):
+        return insights_summary(self.snapshot, self.forecast)
+
+    # --- Stream handling (RemoteBackend thread) ---
+
+    def _follow(self, update_callback):
+        while self.running:
+            try:
+                self._stream = urlopen(f"{self.url}/api/stream", timeout=API_HEARTBEAT * 2)
+                event = None
+                for line in self._stream:
+                    if not self.running:
+                        break
+                    line = line.decode("utf-8").rstrip("\r\n")
+                    if line.startswith("event: "):
+                        event = line[len("event: "):]
+                    elif line.startswith("data: ") and event == "snapshot":
+                        self._apply(json.loads(line[len("data: "):]))
+                        if self.running:
+                            update_callback()
+            except RuntimeError:
+                break  # UI is gone
+            except (OSError, ValueError, KeyError) as e:
+                if self.running:
+                    logging.warning(f"Collector stream at {self.url} failed: {e}")
+            finally:
+                if self._stream is not None:
+                    self._stream.close()
+                    self._stream = None
+            if self.running:
+                time.sleep(REMOTE_RETRY)
+
+    def _apply(self, payload):
+        meters = payload["meters"]
+        if any(name not in self.registry.index for name in meters):
+            self._load_meters()
+        n = self.registry.count
+        idx = [self.registry.index[name] for name in meters]
+        readings = list(meters.values())
+        power, kwh, cost = np.zeros(n), np.zeros(n), np.zeros(n)
+        status = np.zeros(n, dtype=np.int8)
+        surges = np.zeros(n, dtype=np.int64)
+        power[idx] = [r["power"] for r in readings]
+        kwh[idx] = [r["kwh"] for r in readings]
+        cost[idx] = [r["cost"] for r in readings]
+        status[idx] = [_STATUS_CODES.get(r["status"], 0) for r in readings]
+        surges[idx] = [payload["surges"].get(name, 0) for name in meters]
+
+        self._update_history(payload["version"], n)
+        timestamp = payload["timestamp"] and datetime.fromisoformat(payload["timestamp"])
+        self.snapshot = FleetSnapshot(payload["version"], timestamp, self.registry.names,
+                                      power, kwh, cost, surges, status)
+        if time.monotonic() >= self._next_forecast:
+            self._next_forecast = time.monotonic() + FORECAST_INTERVAL
+            self._update_forecast(n)
+
+    def _update_history(self, version, n):
+        """Append the samples published since the last update (full reload after a gap or restart)."""
+        have = self._history_version
+        full = have is None or version < have or version - have >= HISTORY_WINDOW
+        if not full and version == have:
+            return
+        params = {"points": HISTORY_WINDOW}
+        if not full:
+            params["last"] = version - have + HISTORY_SLACK
+        data = self._get("/api/history", **params)
+        series = data["series"]
+        block = np.zeros((n, len(next(iter(series.values()), []))))
+        for name, values in series.items():
+            if self.registry.index.get(name, n) < n:
+                block[self.registry.index[name]] = values
+        if full:
+            history = block
+        else:
+            fresh = max(0, min(data["version"] - have, block.shape[1]))
+            old = np.zeros((n, self._history.shape[1]))
+            old[:len(self._history)] = self._history
+            history = np.concatenate([old, block[:, block.shape[1] - fresh:]], axis=1)
+        self._history = history[:, -HISTORY_WINDOW:]
+        self._history_version = data["version"]
+
+    def _update_forecast(self, n):
+        meters = self._get("/api/forecast")["meters"]
+        if not meters:
+            return
+        idx = [self.registry.index[name] for name in meters if name in self.registry.index]
+        values = [v for name, v in meters.items() if name in self.registry.index]
+        forecast = {}
+        for key in values[0]:
+            column = np.zeros(n)
+            column[idx] = [v[key] for v in values]
+            forecast[key] = column
+        self.forecast = forecast
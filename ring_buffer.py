@@ -0,0 +1,66 @@
+import numpy as np
+
+
+def ordered_view(data, pos, count, last=None):
+    capacity = data.shape[1] // 2
+    k = count if last is None else min(last, count)
+    end = pos + capacity
+    return data[:, end - k:end]
+
+
+class RingBuffer:
+    """Preallocated 2-D ring buffer: one row per series, one column per sample.
+
+    Every sample is written twice (at pos and pos + capacity) so the most
+    recent `capacity` samples are always one contiguous slice. view() returns
+    that slice oldest-to-newest without copying.
+    """
+
+    def __init__(self, n_series, capacity, dtype=np.float64):
+        self.capacity = capacity
+        self._data = np.zeros((n_series, 2 * capacity), dtype=dtype)
+        self._pos = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def n_series(self):
+        return self._data.shape[0]
+
+    def append(self, values):
+        """Add one sample per series (O(1) per series, no reallocation)."""
+        pos = self._pos
+        self._data[:, pos] = values
+        self._data[:, pos + self.capacity] = values
+        self._pos = (pos + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def view(self, last=None):
+        """Ordered (n_series, k) view of the newest k samples, oldest first."""
+        return ordered_view(self._data, self._pos, self._count, last)
+
+    def marker(self):
+        """(data, pos, count) needed to rebuild the current view later with ordered_view()."""
+        return self._data, self._pos, self._count
+
+    def series(self, i, last=None):
+        return self.view(last)[i]
+
+    def latest(self):
+        return self._data[:, self._pos + self.capacity - 1]
+
+    def resize_series(self, n_series):
+        """Add rows for newly registered series; existing history is kept."""
+        old = self.n_series
+        if n_series <= old:
+            return
+        data = np.zeros((n_series, self._data.shape[1]), dtype=self._data.dtype)
+        data[:old] = self._data
+        self._data = data
+
+    def clear(self):
+        self._pos = 0
+        self._count = 0
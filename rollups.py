@@ -0,0 +1,150 @@
+import numpy as np
+from schema import ROLLUPS, FLAG_SURGE, MINUTE_MS, query_readings
+
+
+def _upsert_sql(table):
+    return f'''INSERT INTO {table} (appliance_id, bucket, kwh, cost, max_power, sum_power, samples, surges)
+               VALUES (?,?,?,?,?,?,?,?)
+               ON CONFLICT (appliance_id, bucket) DO UPDATE SET
+                   kwh = kwh + excluded.kwh,
+                   cost = cost + excluded.cost,
+                   max_power = MAX(max_power, excluded.max_power),
+                   sum_power = sum_power + excluded.sum_power,
+                   samples = samples + excluded.samples,
+                   surges = surges + excluded.surges'''
+
+
+UPSERTS = {table: _upsert_sql(table) for table, _ in ROLLUPS}
+
+
+def aggregate(appliance_id, ts, power, kwh, cost, flags, size):
+    """Group reading arrays into (appliance_id, bucket) totals for one bucket size."""
+    bucket = ts - ts % size
+    # Fold (appliance_id, bucket) into one int64 key so np.unique stays 1-D
+    first = bucket.min()
+    span = (bucket.max() - first) // size + 1
+    keys = appliance_id * span + (bucket - first) // size
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    m = len(uniq)
+    max_power = np.full(m, -np.inf)
+    np.maximum.at(max_power, inverse, power)
+    return (
+        uniq // span, first + (uniq % span) * size,
+        np.bincount(inverse, kwh, m),
+        np.bincount(inverse, cost, m),
+        max_power,
+        np.bincount(inverse, power, m),
+        np.bincount(inverse, minlength=m),
+        np.bincount(inverse, (flags & FLAG_SURGE) != 0, m),
+    )
+
+
+def update_rollups(conn, rows):
+    """ReadingWriter flush hook: fold a batch of schema-v2 rows into every rollup table.
+
+    Runs inside the writer's transaction, so raw rows and rollups commit together.
+    """
+    if not rows:
+        return
+    cols = list(zip(*rows))
+    appliance_id = np.asarray(cols[0], dtype=np.int64)
+    ts = np.asarray(cols[1], dtype=np.int64)
+    power = np.asarray(cols[2], dtype=np.float64)
+    kwh = np.asarray(cols[3], dtype=np.float64)
+    cost = np.asarray(cols[4], dtype=np.float64)
+    flags = np.asarray(cols[5], dtype=np.int64)
+
+    for table, size in ROLLUPS:
+        agg = aggregate(appliance_id, ts, power, kwh, cost, flags, size)
+        conn.executemany(UPSERTS[table], zip(*(col.tolist() for col in agg)))
+
+
+# --- Queries ---
+
+def plan_range(start_ms, end_ms):
+    """Split [start_ms, end_ms) into (table, start, end) pieces, using the coarsest rollup possible.
+
+    Edges that are not minute-aligned are answered from raw readings.
+    """
+    pieces = []
+
+    def split(start, end, level):
+        if start >= end:
+            return
+        if level < 0:
+            pieces.append(("readings", start, end))
+            return
+        table, size = ROLLUPS[level]
+        lo = -(-start // size) * size
+        hi = end - end % size
+        if lo >= hi:
+            split(start, end, level - 1)
+            return
+        split(start, lo, level - 1)
+        pieces.append((table, lo, hi))
+        split(hi, end, level - 1)
+
+    split(start_ms, end_ms, len(ROLLUPS) - 1)
+    return pieces
+
+
+def query_usage(conn, start_ms, end_ms, appliance_id=None):
+    """Per-appliance totals over [start_ms, end_ms).
+
+    Returns {appliance_id: {'kwh', 'cost', 'max_power', 'avg_power', 'samples', 'surges'}}.
+    """
+    totals = {}
+
+    def add(aid, kwh, cost, max_power, sum_power, samples, surges):
+        t = totals.setdefault(aid, {'kwh': 0.0, 'cost': 0.0, 'max_power': 0.0,
+                                    'sum_power': 0.0, 'samples': 0, 'surges': 0})
+        t['kwh'] += kwh
+        t['cost'] += cost
+        t['max_power'] = max(t['max_power'], max_power)
+        t['sum_power'] += sum_power
+        t['samples'] += samples
+        t['surges'] += surges
+
+    for table, start, end in plan_range(start_ms, end_ms):
+        if table == "readings":
+            for aid, ts, power, kwh, cost, flags in query_readings(conn, start, end, appliance_id):
+                add(aid, kwh, cost, power, power, 1, int(bool(flags & FLAG_SURGE)))
+            continue
+        where = "bucket >= ? AND bucket < ?"
+        params = [start, end]
+        if appliance_id is not None:
+            where = "appliance_id = ? AND " + where
+            params = [appliance_id] + params
+        for row in conn.execute(
+            f'''SELECT appliance_id, SUM(kwh), SUM(cost), MAX(max_power), SUM(sum_power),
+                       SUM(samples), SUM(surges)
+                FROM {table} WHERE {where} GROUP BY appliance_id''', params
+        ):
+            add(*row)
+
+    for t in totals.values():
+        t['avg_power'] = t.pop('sum_power') / t['samples'] if t['samples'] else 0.0
+    return totals
+
+
+def pick_rollup(step_ms):
+    """Coarsest rollup whose bucket size evenly divides step_ms."""
+    for table, size in reversed(ROLLUPS):
+        if size <= step_ms and step_ms % size == 0:
+            return table, size
+    raise ValueError(f"step must be a multiple of {MINUTE_MS} ms")
+
+
+def query_series(conn, start_ms, end_ms, step_ms, appliance_id=None):
+    """Bucketed usage for charts: [(appliance_id, bucket, kwh, cost, max_power, avg_power, surges)]."""
+    table, _ = pick_rollup(step_ms)
+    where = "bucket >= ? AND bucket < ?"
+    params = [start_ms, end_ms]
+    if appliance_id is not None:
+        where = "appliance_id = ? AND " + where
+        params = [appliance_id] + params
+    return conn.execute(
+        f'''SELECT appliance_id, bucket - bucket % {step_ms} AS b, SUM(kwh), SUM(cost), MAX(max_power),
+                   SUM(sum_power) / SUM(samples), SUM(surges)
+            FROM {table} WHERE {where} GROUP BY appliance_id, b ORDER BY b, appliance_id''', params
+    ).fetchall()
@@ -0,0 +1,441 @@
+import sqlite3
+import time
+import calendar
+import logging
+import argparse
+from operator import itemgetter
+import numpy as np
+from codec import encode_ints, decode_ints, encode_floats, decode_floats
+
+# PRAGMA user_version of a fully migrated database
+SCHEMA_VERSION = 6
+
+# Bit flags stored per reading (replaces the per-row status string)
+FLAG_SURGE = 1
+FLAG_STANDBY = 2
+
+MINUTE_MS = 60_000
+HOUR_MS = 3_600_000
+DAY_MS = 86_400_000
+PARTITION_PREFIX = "readings_"
+
+# Pre-aggregated tables, finest first (buckets are UTC-aligned)
+ROLLUPS = [("rollup_1m", MINUTE_MS), ("rollup_1h", HOUR_MS), ("rollup_1d", DAY_MS)]
+
+# Cold storage: readings older than the retention window are compacted into one
+# compressed chunk per meter per COLD_BLOCK_MS. Power is kept to COLD_POWER_QUANTUM
+# watts (None = bit-exact); kWh and cost are always stored losslessly.
+COLD_BLOCK_MS = 6 * HOUR_MS
+COLD_POWER_QUANTUM = 0.01
+
+READINGS_COLUMNS = "(appliance_id, ts, power, kwh, cost, flags)"
+READINGS_INSERT = f"INSERT INTO readings {READINGS_COLUMNS} VALUES (?,?,?,?,?,?)"
+
+
+def _readings_ddl(table):
+    return f'''CREATE TABLE IF NOT EXISTS {table}
+               (id INTEGER PRIMARY KEY,
+                appliance_id INTEGER NOT NULL REFERENCES appliances(id),
+                ts INTEGER NOT NULL,
+                power REAL, kwh REAL, cost REAL,
+                flags INTEGER NOT NULL DEFAULT 0)'''
+
+
+def _readings_indexes(table):
+    return [
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_appliance_ts ON {table} (appliance_id, ts)",
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_ts ON {table} (ts)",
+    ]
+
+
+def drop_readings_indexes(conn, table="readings"):
+    """Drop secondary indexes before a bulk load; restore them with create_readings_indexes()."""
+    for name in (f"idx_{table}_appliance_ts", f"idx_{table}_ts"):
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def create_readings_indexes(conn, table="readings"):
+    for ddl in _readings_indexes(table):
+        conn.execute(ddl)
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def migrate(conn):
+    """Bring a database of any earlier layout up to SCHEMA_VERSION (idempotent)."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+
+    with conn:
+        conn.execute("BEGIN")  # DDL included, so a failed migration leaves the old layout intact
+        if version < 2:
+            _migrate_v2(conn)
+        if version < 3:
+            _migrate_v3(conn)
+        if version < 4:
+            _migrate_v4(conn)
+        if version < 5:
+            _migrate_v5(conn)
+        if version < 6:
+            _migrate_v6(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def _migrate_v2(conn):
+    """Integer appliance ids and epoch-ms timestamps, indexed."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS sessions
+                    (id INTEGER PRIMARY KEY, start_time TEXT, end_time TEXT,
+                     total_kwh REAL, total_cost REAL, surges INTEGER)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS appliances
+                    (id INTEGER PRIMARY KEY, name TEXT UNIQUE, config TEXT)''')
+
+    legacy = "appliance" in _columns(conn, "readings")
+    if legacy:
+        conn.execute("ALTER TABLE readings RENAME TO readings_legacy")
+
+    conn.execute(_readings_ddl("readings"))
+    for ddl in _readings_indexes("readings"):
+        conn.execute(ddl)
+
+    if legacy:
+        _copy_legacy_readings(conn)
+        conn.execute("DROP TABLE readings_legacy")
+
+    # Human-readable view for ad-hoc queries
+    conn.execute('''CREATE VIEW IF NOT EXISTS readings_named AS
+                    SELECT r.id, a.name AS appliance,
+                           datetime(r.ts / 1000, 'unixepoch', 'localtime') AS timestamp,
+                           r.power, r.kwh, r.cost, r.flags
+                    FROM readings r JOIN appliances a ON a.id = r.appliance_id''')
+
+
+def _migrate_v3(conn):
+    """Minute/hour/day rollup tables, backfilled from the readings already stored."""
+    for table, _ in ROLLUPS:
+        conn.execute(f'''CREATE TABLE IF NOT EXISTS {table}
+                         (appliance_id INTEGER NOT NULL, bucket INTEGER NOT NULL,
+                          kwh REAL NOT NULL, cost REAL NOT NULL,
+                          max_power REAL NOT NULL, sum_power REAL NOT NULL,
+                          samples INTEGER NOT NULL, surges INTEGER NOT NULL,
+                          PRIMARY KEY (appliance_id, bucket)) WITHOUT ROWID''')
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table} (bucket)")
+    rebuild_rollups(conn)
+
+
+def _migrate_v4(conn):
+    """Surge events found by the streaming detector (end_ts is NULL while an event is open)."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS surge_events
+                    (id INTEGER PRIMARY KEY,
+                     appliance_id INTEGER NOT NULL REFERENCES appliances(id),
+                     start_ts INTEGER NOT NULL, end_ts INTEGER,
+                     peak_power REAL NOT NULL, baseline REAL NOT NULL, zscore REAL NOT NULL,
+                     samples INTEGER NOT NULL DEFAULT 1,
+                     UNIQUE (appliance_id, start_ts))''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_surge_events_start ON surge_events (start_ts)")
+
+
+def _migrate_v5(conn):
+    """Sessions record their sampling: mean seconds between samples, sample and skipped-slot counts."""
+    columns = _columns(conn, "sessions")
+    for column, kind in (("sample_interval", "REAL"), ("samples", "INTEGER"), ("skipped_samples", "INTEGER")):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE sessions ADD COLUMN {column} {kind}")
+
+
+def _migrate_v6(conn):
+    """Compressed cold-storage chunks: one row per meter per block, columns as codec blobs."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS cold_chunks
+                    (id INTEGER PRIMARY KEY,
+                     appliance_id INTEGER NOT NULL REFERENCES appliances(id),
+                     block INTEGER NOT NULL, start_ts INTEGER NOT NULL, end_ts INTEGER NOT NULL,
+                     rows INTEGER NOT NULL,
+                     ts BLOB NOT NULL, power BLOB NOT NULL, kwh BLOB NOT NULL,
+                     cost BLOB NOT NULL, flags BLOB NOT NULL,
+                     UNIQUE (appliance_id, block))''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cold_chunks_block ON cold_chunks (block)")
+
+
+def _copy_legacy_readings(conn):
+    """Move TEXT-keyed v1 rows into the integer schema inside the current transaction."""
+    conn.execute('''INSERT OR IGNORE INTO appliances (name)
+                    SELECT DISTINCT appliance FROM readings_legacy''')
+    # Legacy timestamps were written with datetime.now(), i.e. local time
+    conn.execute(f'''INSERT INTO readings {READINGS_COLUMNS}
+                     SELECT a.id,
+                            CAST(strftime('%s', l.timestamp, 'utc') AS INTEGER) * 1000,
+                            l.power, l.kwh, l.cost,
+                            CASE WHEN l.status LIKE '%SURGE%' THEN {FLAG_SURGE}
+                                 WHEN l.status = 'Standby' THEN {FLAG_STANDBY}
+                                 ELSE 0 END
+                     FROM readings_legacy l JOIN appliances a ON a.name = l.appliance
+                     ORDER BY l.id''')
+    moved = conn.execute("SELECT changes()").fetchone()[0]
+    logging.info(f"Migrated {moved} legacy readings to schema v{SCHEMA_VERSION}")
+
+
+# --- Time-based partitioning (one table per UTC day) ---
+
+def partition_table(ts_ms):
+    return PARTITION_PREFIX + time.strftime("%Y%m%d", time.gmtime(ts_ms // 1000))
+
+
+def ensure_partition(conn, table):
+    conn.execute(_readings_ddl(table))
+    for ddl in _readings_indexes(table):
+        conn.execute(ddl)
+
+
+def list_partitions(conn):
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name GLOB ?",
+        (PARTITION_PREFIX + "[0-9]*",)
+    )
+    return sorted(row[0] for row in rows)
+
+
+def partition_day(table):
+    """Day number (days since the epoch, UTC) a partition table covers."""
+    day = time.strptime(table[len(PARTITION_PREFIX):], "%Y%m%d")
+    return calendar.timegm(day) // 86400
+
+
+def partitions_for_range(conn, start_ms, end_ms):
+    """Tables that may hold rows with start_ms <= ts < end_ms (the main table always qualifies)."""
+    first = start_ms // DAY_MS
+    last = (end_ms - 1) // DAY_MS
+    return ["readings"] + [t for t in list_partitions(conn) if first <= partition_day(t) <= last]
+
+
+def insert_partitioned(conn, rows):
+    """Insert schema-v2 row tuples, routing each to its day table by ts."""
+    by_table = {}
+    for row in rows:
+        by_table.setdefault(partition_table(row[1]), []).append(row)
+    for table, chunk in by_table.items():
+        ensure_partition(conn, table)
+        conn.executemany(f"INSERT INTO {table} {READINGS_COLUMNS} VALUES (?,?,?,?,?,?)", chunk)
+
+
+def query_readings(conn, start_ms, end_ms, appliance_id=None):
+    """(appliance_id, ts, power, kwh, cost, flags) rows in [start_ms, end_ms) across partitions
+    and cold storage."""
+    rows = _range_cursor(conn, start_ms, end_ms, appliance_id).fetchall()
+    cold = [row for block in _cold_blocks(conn, start_ms, end_ms, appliance_id) for row in block]
+    return sorted(cold + rows, key=itemgetter(1)) if cold else rows
+
+
+def iter_readings(conn, start_ms, end_ms, appliance_id=None, chunk_size=50000):
+    """Like query_readings, but yields lists of at most chunk_size rows.
+
+    Cold blocks come first, so rows are in ts order as long as nothing older
+    than the last compaction was written to the raw tables afterwards.
+    """
+    for block in _cold_blocks(conn, start_ms, end_ms, appliance_id):
+        for i in range(0, len(block), chunk_size):
+            yield block[i:i + chunk_size]
+    cursor = _range_cursor(conn, start_ms, end_ms, appliance_id)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield rows
+
+
+def _range_cursor(conn, start_ms, end_ms, appliance_id):
+    where = "ts >= ? AND ts < ?"
+    params = [start_ms, end_ms]
+    if appliance_id is not None:
+        where = "appliance_id = ? AND " + where
+        params = [appliance_id] + params
+    tables = partitions_for_range(conn, start_ms, end_ms)
+    sql = " UNION ALL ".join(
+        f"SELECT appliance_id, ts, power, kwh, cost, flags FROM {t} WHERE {where}" for t in tables
+    )
+    return conn.execute(sql + " ORDER BY ts", params * len(tables))
+
+
+# --- Cold storage ---
+
+def _encode_chunk(ts, power, kwh, cost, flags, quantum):
+    return (encode_ints(ts, order=2), encode_floats(power, quantum), encode_floats(kwh),
+            encode_floats(cost), encode_ints(flags))
+
+
+def _decode_chunk(aid, ts, power, kwh, cost, flags):
+    ts = decode_ints(ts)
+    return (np.full(len(ts), aid), ts, decode_floats(power), decode_floats(kwh),
+            decode_floats(cost), decode_ints(flags))
+
+
+def _cold_blocks(conn, start_ms, end_ms, appliance_id=None):
+    """Yield the cold rows in [start_ms, end_ms) one block at a time, each sorted by ts.
+
+    Only chunks whose time span overlaps the range are read and decoded.
+    """
+    where = "block > ? AND block < ? AND start_ts < ? AND end_ts > ?"
+    params = [start_ms - COLD_BLOCK_MS, end_ms, end_ms, start_ms]
+    if appliance_id is not None:
+        where = "appliance_id = ? AND " + where
+        params = [appliance_id] + params
+    cursor = conn.execute(f'''SELECT block, appliance_id, ts, power, kwh, cost, flags FROM cold_chunks
+                              WHERE {where} ORDER BY block''', params)
+    pending, current = [], None
+    for block, *chunk in cursor:
+        if block != current and pending:
+            yield _cold_rows(pending, start_ms, end_ms)
+            pending = []
+        current = block
+        pending.append(_decode_chunk(*chunk))
+    if pending:
+        yield _cold_rows(pending, start_ms, end_ms)
+
+
+def _cold_rows(chunks, start_ms, end_ms):
+    aid, ts, power, kwh, cost, flags = (np.concatenate(col) for col in zip(*chunks))
+    keep = np.flatnonzero((ts >= start_ms) & (ts < end_ms))
+    keep = keep[np.argsort(ts[keep], kind="stable")]
+    return list(zip(aid[keep].tolist(), ts[keep].tolist(), power[keep].tolist(), kwh[keep].tolist(),
+                    cost[keep].tolist(), flags[keep].tolist()))
+
+
+def cold_horizon(conn):
+    """End of the newest compacted block (0 if nothing has been compacted)."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'cold_chunks'").fetchone():
+        return 0
+    block = conn.execute("SELECT MAX(block) FROM cold_chunks").fetchone()[0]
+    return 0 if block is None else block + COLD_BLOCK_MS
+
+
+def compact_readings(conn, before_ms, quantum=COLD_POWER_QUANTUM):
+    """Move raw readings older than before_ms (rounded down to a block) into cold_chunks.
+
+    One transaction per meter per block: the chunk is written (merged with
+    any chunk already stored for that block) and its raw rows deleted
+    together, so an interrupted compaction loses nothing and simply resumes.
+    Rollups are left as they are. Day partitions emptied this way are dropped;
+    pages freed in the main table are reused, or returned with VACUUM.
+    Returns rows moved.
+    """
+    cutoff = before_ms - before_ms % COLD_BLOCK_MS
+    moved = 0
+    while True:
+        firsts = [conn.execute(f"SELECT MIN(ts) FROM {t} WHERE ts < ?", (cutoff,)).fetchone()[0]
+                  for t in ["readings"] + list_partitions(conn)]
+        firsts = [ts for ts in firsts if ts is not None]
+        if not firsts:
+            break
+        block = min(firsts) - min(firsts) % COLD_BLOCK_MS
+        span = (block, block + COLD_BLOCK_MS)
+        tables = partitions_for_range(conn, *span)
+        ids = set()
+        for t in tables:
+            ids.update(row[0] for row in conn.execute(
+                f"SELECT DISTINCT appliance_id FROM {t} WHERE ts >= ? AND ts < ?", span))
+        for aid in sorted(ids):
+            with conn:
+                moved += _compact_chunk(conn, tables, aid, block, quantum)
+        logging.info(f"Compacted block {time.strftime('%Y-%m-%d %H:%M', time.gmtime(block // 1000))} UTC "
+                     f"({len(ids)} meters, {moved} rows so far)")
+
+    for t in list_partitions(conn):
+        if (partition_day(t) + 1) * DAY_MS <= cutoff and not conn.execute(f"SELECT 1 FROM {t} LIMIT 1").fetchone():
+            with conn:
+                conn.execute(f"DROP TABLE {t}")
+    return moved
+
+
+def _compact_chunk(conn, tables, aid, block, quantum):
+    span = (aid, block, block + COLD_BLOCK_MS)
+    rows = []
+    for t in tables:
+        rows += conn.execute(f'''SELECT ts, power, kwh, cost, flags FROM {t}
+                                 WHERE appliance_id = ? AND ts >= ? AND ts < ?''', span).fetchall()
+    ts = np.array([r[0] for r in rows], dtype=np.int64)
+    flags = np.array([r[4] for r in rows], dtype=np.int64)
+    # NULL power/kWh/cost (possible in imported or legacy rows) are stored as 0
+    power, kwh, cost = (np.array([0.0 if r[i] is None else r[i] for r in rows]) for i in (1, 2, 3))
+    columns = (ts, power, kwh, cost, flags)
+    existing = conn.execute('''SELECT appliance_id, ts, power, kwh, cost, flags FROM cold_chunks
+                               WHERE appliance_id = ? AND block = ?''', (aid, block)).fetchone()
+    if existing:
+        columns = [np.concatenate(pair) for pair in zip(_decode_chunk(*existing)[1:], columns)]
+    order = np.argsort(columns[0], kind="stable")
+    ts, power, kwh, cost, flags = (col[order] for col in columns)
+    conn.execute('''INSERT OR REPLACE INTO cold_chunks
+                    (appliance_id, block, start_ts, end_ts, rows, ts, power, kwh, cost, flags)
+                    VALUES (?,?,?,?,?,?,?,?,?,?)''',
+                 (aid, block, int(ts[0]), int(ts[-1]) + 1, len(ts),
+                  *_encode_chunk(ts, power, kwh, cost, flags, quantum)))
+    for t in tables:
+        conn.execute(f"DELETE FROM {t} WHERE appliance_id = ? AND ts >= ? AND ts < ?", span)
+    return len(rows)
+
+
+def partition_existing(conn):
+    """Move rows from the main readings table into per-day partitions, one day per transaction."""
+    while True:
+        row = conn.execute("SELECT MIN(ts) FROM readings").fetchone()
+        if row[0] is None:
+            return
+        day_start = row[0] - row[0] % DAY_MS
+        day_end = day_start + DAY_MS
+        with conn:
+            table = partition_table(day_start)
+            ensure_partition(conn, table)
+            conn.execute(f'''INSERT INTO {table} {READINGS_COLUMNS}
+                             SELECT appliance_id, ts, power, kwh, cost, flags FROM readings
+                             WHERE ts >= ? AND ts < ? ORDER BY ts''', (day_start, day_end))
+            conn.execute("DELETE FROM readings WHERE ts >= ? AND ts < ?", (day_start, day_end))
+        logging.info(f"Partitioned readings into {table}")
+
+
+def rebuild_rollups(conn, start_ms=None, end_ms=None):
+    """Recompute rollup rows for [start_ms, end_ms) (everything by default) from raw readings.
+
+    Bounds should be day-aligned so no bucket is only partly recomputed.
+    Compacted (cold) ranges are skipped: their rollups stay as they were, and
+    so does any bucket the cold horizon falls inside (each level starts at its
+    first bucket past the horizon).
+    """
+    start_ms = 0 if start_ms is None else start_ms
+    end_ms = 2 ** 62 if end_ms is None else end_ms
+    horizon = cold_horizon(conn)
+    tables = ["readings"] + list_partitions(conn)
+    source = " UNION ALL ".join(
+        f"SELECT appliance_id, ts, power, kwh, cost, flags FROM {t} WHERE ts >= ? AND ts < ?"
+        for t in tables
+    )
+    for table, size in ROLLUPS:
+        level_start = max(start_ms, -(-horizon // size) * size)
+        conn.execute(f"DELETE FROM {table} WHERE bucket >= ? AND bucket < ?", (level_start, end_ms))
+        conn.execute(f'''INSERT INTO {table}
+                         SELECT appliance_id, ts - ts % {size}, SUM(kwh), SUM(cost),
+                                MAX(power), SUM(power), COUNT(*), SUM(flags & {FLAG_SURGE})
+                         FROM ({source}) GROUP BY 1, 2''', [level_start, end_ms] * len(tables))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate a WattFinder database to the current schema")
+    parser.add_argument("db", nargs="?", default="wattfinder_enterprise.db")
+    parser.add_argument("--partition", action="store_true",
+                        help="also move existing readings into per-day tables")
+    parser.add_argument("--compact-days", type=float,
+                        help="move raw readings older than this many days into compressed cold storage")
+    parser.add_argument("--vacuum", action="store_true", help="return freed pages to the filesystem")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    with sqlite3.connect(args.db) as conn:
+        migrate(conn)
+        if args.partition:
+            partition_existing(conn)
+        if args.compact_days is not None:
+            moved = compact_readings(conn, int((time.time() - args.compact_days * 86400) * 1000))
+            logging.info(f"Moved {moved} readings to cold storage")
+    if args.vacuum:
+        conn = sqlite3.connect(args.db)
+        conn.execute("VACUUM")
+        conn.close()
@@ -0,0 +1,293 @@
+import os
+import time
+import signal
+import sqlite3
+import logging
+import argparse
+import threading
+import multiprocessing as mp
+from datetime import datetime
+from multiprocessing import shared_memory
+import numpy as np
+import schema
+from meter_registry import MeterRegistry, STATUS_FLAGS, STATUS_SURGE
+from rollups import update_rollups
+from simulator import FleetSimulator
+from snapshot import FleetSnapshot
+from tariff import Tariff
+
+# Rows of the shared fleet state array (float64, shape (STATE_ROWS, meters))
+POWER, KWH, COST, SURGES, STATUS = range(5)
+STATE_ROWS = 5
+
+# Blocks in flight per shard; a worker waits for the writer once all are full
+SHARD_SLOTS = 4
+
+
+def _attach(name):
+    return shared_memory.SharedMemory(name=name)
+
+
+def _shard_worker(shard, n_shards, lo, configs, seed, interval, block_ticks, start_ms, end_ms,
+                  realtime, state_name, n_meters, buf_name, slots, free, out, stop):
+    """Simulate meters [lo, lo + len(configs)) and hand blocks to the writer via shared memory."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent stops us through `stop`
+    registry = MeterRegistry.from_config(configs)
+    sim = FleetSimulator(registry, seed=seed, interval=interval)
+    m = registry.count
+    state_shm, buf_shm = _attach(state_name), _attach(buf_name)
+    state = np.ndarray((STATE_ROWS, n_meters), dtype=np.float64, buffer=state_shm.buf)[:, lo:lo + m]
+    bufs = np.ndarray((slots, 2, m, block_ticks), dtype=np.float64, buffer=buf_shm.buf)
+
+    step_ms = int(interval * 1000)
+    t = start_ms
+    k = 0
+    next_tick = time.monotonic()
+    try:
+        while not stop.is_set() and (end_ms is None or t < end_ms):
+            ticks = block_ticks if end_ms is None else min(block_ticks, -(-(end_ms - t) // step_ms))
+            # Streams are keyed per (tick, shard) so shards never share random draws
+            ts, power, status = sim.block(t, ticks, key=1 + (t // step_ms) * n_shards + shard)
+            while not free.acquire(timeout=0.5):
+                if stop.is_set():
+                    return
+            slot = k % slots
+            bufs[slot, 0, :, :ticks] = power
+            bufs[slot, 1, :, :ticks] = status
+
+            # Per-shard accounting straight into this shard's slice of the fleet state
+            state[POWER] = power[:, -1]
+            state[STATUS] = status[:, -1]
+            state[KWH] += power.sum(axis=1) * (interval / 3600) / 1000
+            state[SURGES] += (status == STATUS_SURGE).sum(axis=1)
+            out.put((shard, slot, t, ticks))
+            t += ticks * step_ms
+            k += 1
+
+            if realtime:
+                next_tick += ticks * interval
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    stop.wait(delay)
+                else:
+                    next_tick = time.monotonic()  # overrun: don't try to catch up
+    finally:
+        out.put((shard, None, None, None))
+        del state, bufs
+        state_shm.close()
+        buf_shm.close()
+
+
+def _writer(db_name, shard_ranges, db_ids, interval, block_ticks, slots, tariff_config,
+            state_name, n_meters, buf_names, frees, inbox, counters, commit_rows):
+    """Single SQLite writer: read shard blocks out of shared memory, price, insert, roll up."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # exits once every shard has signed off
+    tariff = Tariff.from_config(tariff_config)
+    conn = sqlite3.connect(db_name)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    month_kwh = tariff.load_months(conn, [int(time.time() * 1000)], {})
+    state_shm = _attach(state_name)
+    state = np.ndarray((STATE_ROWS, n_meters), dtype=np.float64, buffer=state_shm.buf)
+    shms = [_attach(name) for name in buf_names]
+    bufs = [np.ndarray((slots, 2, hi - lo, block_ticks), dtype=np.float64, buffer=shm.buf)
+            for shm, (lo, hi) in zip(shms, shard_ranges)]
+    step_ms = int(interval * 1000)
+    live = len(shard_ranges)
+    pending = []
+
+    def flush():
+        with conn:
+            conn.executemany(schema.READINGS_INSERT, pending)
+            update_rollups(conn, pending)
+        with counters.get_lock():
+            counters[0] += len(pending)
+            counters[1] += 1
+        pending.clear()
+
+    try:
+        while live:
+            shard, slot, t, ticks = inbox.get()
+            if slot is None:
+                live -= 1
+                continue
+            lo, hi = shard_ranges[shard]
+            m = hi - lo
+            power = bufs[shard][slot, 0, :, :ticks].copy()
+            status = bufs[shard][slot, 1, :, :ticks].astype(np.int64)
+            frees[shard].release()  # slot can be refilled while we write
+
+            ts = np.tile(t + np.arange(ticks, dtype=np.int64) * step_ms, m)
+            kwh = (power * (interval / 3600) / 1000).ravel()
+            tariff.load_months(conn, ts[:1], month_kwh)
+            cost = tariff.price(ts, kwh, month_kwh)
+            state[COST, lo:hi] += cost.reshape(m, ticks).sum(axis=1)
+            pending.extend(zip(
+                np.repeat(db_ids[lo:hi], ticks).tolist(), ts.tolist(), power.ravel().tolist(),
+                kwh.tolist(), cost.tolist(), STATUS_FLAGS[status].ravel().tolist()
+            ))
+            if len(pending) >= commit_rows or inbox.empty():
+                flush()
+        if pending:
+            flush()
+    finally:
+        del state, bufs
+        state_shm.close()
+        for shm in shms:
+            shm.close()
+        conn.close()
+
+
+class ShardedCollector:
+    """Simulator ingest spread over worker processes, sharded by meter.
+
+    Each worker owns a contiguous range of meters: it simulates them in
+    blocks, accounts kWh/surges into its own slice of a shared fleet-state
+    array, and drops each block into one of its shared-memory slots. Only
+    (shard, slot, ts, ticks) tuples cross the queue. One writer process reads
+    the slots, prices them with the tariff and commits readings plus rollups.
+    snapshot() merges the shard slices into a FleetSnapshot for the usual
+    latest-readings views.
+    """
+
+    def __init__(self, registry, db_name, shards=None, interval=2.0, seed=None, block_ticks=1,
+                 tariff_config=None, commit_rows=50000):
+        self.registry = registry
+        self.db_name = db_name
+        self.shards = max(1, min(shards or os.cpu_count() or 1, registry.count))
+        self.interval = interval
+        self.seed = np.random.SeedSequence(seed).entropy
+        self.block_ticks = block_ticks
+        self.tariff_config = tariff_config or {}
+        self.commit_rows = commit_rows
+        self.counters = mp.Array("q", 2)  # rows written, commits
+        self._procs = []
+        self._shms = []
+        self._stop = mp.Event()
+        self._version = 0
+        self.session_start = None
+
+        n = registry.count
+        bounds = np.linspace(0, n, self.shards + 1).astype(int)
+        self.shard_ranges = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    @property
+    def rows_written(self):
+        return self.counters[0]
+
+    def start(self, start_ms=None, end_ms=None, realtime=True):
+        """Start workers and the writer. start_ms defaults to now; end_ms=None runs until stop()."""
+        n = self.registry.count
+        with sqlite3.connect(self.db_name) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            schema.migrate(conn)
+            self.registry.save_to_db(conn)
+        start_ms = int(time.time() * 1000) if start_ms is None else start_ms
+        self.session_start = datetime.now()
+        self._stop.clear()
+
+        state_shm = shared_memory.SharedMemory(create=True, size=STATE_ROWS * n * 8)
+        np.ndarray((STATE_ROWS, n), dtype=np.float64, buffer=state_shm.buf)[:] = 0
+        self._shms = [state_shm]
+        self._state = np.ndarray((STATE_ROWS, n), dtype=np.float64, buffer=state_shm.buf)
+
+        inbox = mp.Queue()
+        frees, buf_names = [], []
+        names = self.registry.names
+        for shard, (lo, hi) in enumerate(self.shard_ranges):
+            buf = shared_memory.SharedMemory(create=True, size=SHARD_SLOTS * 2 * (hi - lo) * self.block_ticks * 8)
+            self._shms.append(buf)
+            buf_names.append(buf.name)
+            free = mp.Semaphore(SHARD_SLOTS)
+            frees.append(free)
+            configs = {name: self.registry.configs[name] for name in names[lo:hi]}
+            self._procs.append(mp.Process(
+                target=_shard_worker, name=f"shard-{shard}", daemon=True,
+                args=(shard, self.shards, lo, configs, self.seed, self.interval, self.block_ticks,
+                      start_ms, end_ms, realtime, state_shm.name, n, buf.name, SHARD_SLOTS,
+                      free, inbox, self._stop)))
+
+        self._procs.append(mp.Process(
+            target=_writer, name="shard-writer", daemon=True,
+            args=(self.db_name, self.shard_ranges, self.registry.db_id.copy(), self.interval,
+                  self.block_ticks, SHARD_SLOTS, self.tariff_config, state_shm.name, n,
+                  buf_names, frees, inbox, self.counters, self.commit_rows)))
+        for proc in self._procs:
+            proc.start()
+
+    def join(self, timeout=None):
+        for proc in self._procs:
+            proc.join(timeout)
+
+    def stop(self):
+        """Stop the workers, let the writer drain, save the session and free shared memory."""
+        self._stop.set()
+        self.join()
+        self._procs = []
+        if self.session_start:
+            snap = self.snapshot()
+            with sqlite3.connect(self.db_name) as conn:
+                conn.execute(
+                    '''INSERT INTO sessions (start_time, end_time, total_kwh, total_cost, surges, sample_interval)
+                       VALUES (?,?,?,?,?,?)''',
+                    (self.session_start.strftime("%Y-%m-%d %H:%M:%S"),
+                     datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                     snap.total_kwh, snap.total_cost, snap.total_surges, self.interval))
+            self.session_start = None
+        self._state = None
+        for shm in self._shms:
+            shm.close()
+            shm.unlink()
+        self._shms = []
+
+    def snapshot(self):
+        """Merge the per-shard state slices into one FleetSnapshot (copies, so it stays immutable)."""
+        state = self._state.copy()
+        self._version += 1
+        return FleetSnapshot(self._version, datetime.now(), self.registry.names, state[POWER],
+                             state[KWH], state[COST], state[SURGES].astype(np.int64),
+                             state[STATUS].astype(np.int8))
+
+
+def synthetic_fleet(n, template):
+    """n meters cycling through the template configs (for load tests)."""
+    items = list(template.items())
+    return {f"{items[i % len(items)][0]} #{i:05d}": items[i % len(items)][1] for i in range(n)}
+
+
+if __name__ == "__main__":
+    from backend import APPLIANCES_CONFIG, TARIFF_CONFIG, DB_NAME
+
+    parser = argparse.ArgumentParser(description="Sharded multi-process simulator ingest")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--shards", type=int, default=os.cpu_count())
+    parser.add_argument("--meters", type=int, default=0, help="synthetic fleet size (default: configured appliances)")
+    parser.add_argument("--interval", type=float, default=2.0)
+    parser.add_argument("--block-ticks", type=int, default=1, help="ticks per shard block")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--backfill-hours", type=float, default=0,
+                        help="generate this much history as fast as possible instead of running live")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    config = synthetic_fleet(args.meters, APPLIANCES_CONFIG) if args.meters else APPLIANCES_CONFIG
+    collector = ShardedCollector(MeterRegistry.from_config(config), args.db, args.shards, args.interval,
+                                 args.seed, args.block_ticks, TARIFF_CONFIG)
+    started = time.perf_counter()
+    if args.backfill_hours:
+        end = int(time.time() * 1000)
+        collector.start(end - int(args.backfill_hours * schema.HOUR_MS), end, realtime=False)
+        collector.join()
+    else:
+        stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+        collector.start()
+        while not stop.wait(10):
+            snap = collector.snapshot()
+            logging.info(f"{snap.total_power:.0f} W now, {snap.total_kwh:.3f} kWh, "
+                         f"{collector.rows_written} rows written")
+    collector.stop()
+    elapsed = time.perf_counter() - started
+    logging.info(f"{collector.rows_written} rows with {collector.shards} shards in {elapsed:.1f}s "
+                 f"({collector.rows_written / elapsed:.0f} rows/s)")
@@ -0,0 +1,86 @@
+import numpy as np
+from meter_registry import STATUS_LABELS
+from ring_buffer import ordered_view
+
+
+def frozen(arr):
+    arr.flags.writeable = False
+    return arr
+
+
+class FleetSnapshot:
+    """Immutable, versioned view of the backend state after one tick.
+
+    The monitor thread never mutates arrays a snapshot points at: every tick it
+    builds new arrays, wraps them in a new snapshot and swaps one reference.
+    Readers take `backend.snapshot` once and work from that object, so they
+    always see a single consistent tick without taking any lock.
+    """
+
+    __slots__ = ("version", "timestamp", "names", "power", "kwh", "cost", "surges", "status", "_history")
+
+    def __init__(self, version, timestamp, names, power, kwh, cost, surges, status, history=None):
+        set_ = object.__setattr__
+        set_(self, "version", version)
+        set_(self, "timestamp", timestamp)
+        set_(self, "names", names)  # the registry's append-only name list, valid up to len(power)
+        set_(self, "power", frozen(power))
+        set_(self, "kwh", frozen(kwh))
+        set_(self, "cost", frozen(cost))
+        set_(self, "surges", frozen(surges))
+        set_(self, "status", frozen(status))
+        set_(self, "_history", history)  # RingBuffer.marker() taken at publish time
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FleetSnapshot is immutable")
+
+    @classmethod
+    def empty(cls, names=()):
+        n = len(names)
+        return cls(0, None, names, np.zeros(n), np.zeros(n), np.zeros(n),
+                   np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int8))
+
+    @property
+    def n(self):
+        return len(self.power)
+
+    def meter_names(self):
+        return self.names[:self.n]
+
+    @property
+    def total_power(self):
+        return float(self.power.sum())
+
+    @property
+    def total_kwh(self):
+        return float(self.kwh.sum())
+
+    @property
+    def total_cost(self):
+        return float(self.cost.sum())
+
+    @property
+    def total_surges(self):
+        return int(self.surges.sum())
+
+    def latest_readings(self):
+        labels = STATUS_LABELS[self.status]
+        return {
+            name: {'power': p, 'kwh': k, 'cost': c, 'status': st}
+            for name, p, k, c, st in zip(self.meter_names(), self.power.tolist(),
+                                         self.kwh.tolist(), self.cost.tolist(), labels)
+        }
+
+    def surge_count(self):
+        return dict(zip(self.meter_names(), self.surges.tolist()))
+
+    def history(self, last=None):
+        """Ordered (n, k) history view as of this snapshot.
+
+        The ring buffer keeps writing after publication, so only the newest
+        capacity - (ticks since publish) columns stay exactly as published.
+        """
+        if self._history is None:
+            return np.zeros((self.n, 0))
+        data, pos, count = self._history
+        return ordered_view(data, pos, count, last)[:self.n]
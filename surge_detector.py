@@ -0,0 +1,200 @@
+import threading
+import numpy as np
+
+SURGE_EVENT_OPEN = '''INSERT OR IGNORE INTO surge_events
+                      (appliance_id, start_ts, peak_power, baseline, zscore, samples)
+                      VALUES (?,?,?,?,?,?)'''
+SURGE_EVENT_CLOSE = '''UPDATE surge_events SET end_ts = ?, peak_power = ?, zscore = ?, samples = ?
+                       WHERE appliance_id = ? AND start_ts = ?'''
+
+
+class SurgeDetector:
+    """Streaming surge detection on raw power, O(1) per sample and vectorized across meters.
+
+    Each meter keeps an EWMA mean and variance of its running power (samples
+    at or below standby_w are ignored). A sample is a surge candidate when its
+    z-score exceeds z_threshold or it jumps by more than roc_threshold times
+    the baseline since the previous sample; readings the source already
+    flagged as surges are always candidates. An event opens after debounce
+    consecutive candidates (immediately for source-flagged readings) and
+    closes after release consecutive normal samples.
+    """
+
+    def __init__(self, alpha=0.05, z_threshold=3.5, roc_threshold=1.0, debounce=2, release=3,
+                 warmup=20, standby_w=1.0):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.roc_threshold = roc_threshold
+        self.debounce = debounce
+        self.release = release
+        self.warmup = warmup
+        self.standby_w = standby_w
+
+        # Per-meter state, indexed by registry meter id
+        self.mean = np.zeros(0)
+        self.var = np.zeros(0)
+        self.prev = np.zeros(0)
+        self.count = np.zeros(0, dtype=np.int64)
+        self.hits = np.zeros(0, dtype=np.int64)    # consecutive candidates
+        self.hit_ts = np.zeros(0, dtype=np.int64)  # first of those candidates
+        self.quiet = np.zeros(0, dtype=np.int64)   # consecutive normal samples while an event is open
+        self.active = np.zeros(0, dtype=bool)
+        self.start_ts = np.zeros(0, dtype=np.int64)
+        self.peak = np.zeros(0)
+        self.peak_z = np.zeros(0)
+        self.samples = np.zeros(0, dtype=np.int64)
+
+        self.events = 0
+        self._pending = []  # ("open" | "close", meter id, values) for write_events()
+        self._lock = threading.Lock()
+
+    def _grow(self, n):
+        if n <= len(self.mean):
+            return
+        for name in ("mean", "var", "prev", "count", "hits", "hit_ts", "quiet", "active",
+                     "start_ts", "peak", "peak_z", "samples"):
+            old = getattr(self, name)
+            new = np.zeros(n, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def update(self, meter_ids, ts_ms, power, flagged=None):
+        """Feed a batch of readings (any order, several per meter).
+
+        Returns (candidate, opened) boolean arrays aligned with the input:
+        whether each reading looks like a surge, and whether it opened an event.
+        """
+        size = len(meter_ids)
+        candidate = np.zeros(size, dtype=bool)
+        opened = np.zeros(size, dtype=bool)
+        if not size:
+            return candidate, opened
+        if flagged is None:
+            flagged = np.zeros(size, dtype=bool)
+        self._grow(int(meter_ids.max()) + 1)
+
+        # The EWMA is sequential per meter, so walk the batch in rounds:
+        # round k holds every meter's k-th reading and is processed as one vector op.
+        order = np.lexsort((ts_ms, meter_ids))
+        sorted_ids = meter_ids[order]
+        first = np.ones(size, dtype=bool)
+        first[1:] = sorted_ids[1:] != sorted_ids[:-1]
+        starts = np.flatnonzero(first)
+        rank = np.arange(size) - np.repeat(starts, np.diff(np.append(starts, size)))
+        by_round = order[np.argsort(rank, kind="stable")]
+        bounds = np.cumsum(np.bincount(rank))
+
+        lo = 0
+        for hi in bounds:
+            sel = by_round[lo:hi]
+            candidate[sel], opened[sel] = self._step(meter_ids[sel], ts_ms[sel], power[sel], flagged[sel])
+            lo = hi
+        return candidate, opened
+
+    def _step(self, ids, ts, x, flagged):
+        """One reading for each of ids (unique)."""
+        mean, var, prev, count = self.mean[ids], self.var[ids], self.prev[ids], self.count[ids]
+
+        running = x > self.standby_w
+        std = np.maximum(np.sqrt(var), 1.0)
+        z = (x - mean) / std
+        jump = (x - prev) / np.maximum(mean, self.standby_w)
+        warm = running & (count >= self.warmup)
+        candidate = flagged | (warm & ((z > self.z_threshold) |
+                                       ((prev > self.standby_w) & (jump > self.roc_threshold))))
+
+        # EWMA mean/variance; a plain running mean until warmup has enough samples.
+        # Warm samples are clipped at the threshold so a spike cannot inflate the
+        # variance and mask the rest of the surge; a lasting level shift still
+        # pulls the baseline up within a few dozen samples.
+        alpha = np.maximum(self.alpha, 1.0 / (count + 1))
+        diff = np.where(warm, np.minimum(x, mean + self.z_threshold * std), x) - mean
+        incr = alpha * diff
+        self.mean[ids] = np.where(running, mean + incr, mean)
+        self.var[ids] = np.where(running, (1 - alpha) * (var + diff * incr), var)
+        self.count[ids] = count + running
+        self.prev[ids] = np.where(running, x, prev)
+
+        # Debounce
+        hits = np.where(candidate, self.hits[ids] + 1, 0)
+        quiet = np.where(candidate, 0, self.quiet[ids] + 1)
+        self.hits[ids] = hits
+        hit_ts = np.where(hits == 1, ts, self.hit_ts[ids])
+        self.hit_ts[ids] = hit_ts
+        self.quiet[ids] = quiet
+        active = self.active[ids]
+        opening = ~active & candidate & (flagged | (hits >= self.debounce))
+        closing = active & (quiet >= self.release)
+        ongoing = active & ~closing
+
+        self.peak[ids] = np.where(opening, x, np.where(ongoing, np.maximum(self.peak[ids], x), self.peak[ids]))
+        self.peak_z[ids] = np.where(opening, z, np.where(ongoing, np.maximum(self.peak_z[ids], z), self.peak_z[ids]))
+        self.samples[ids] += ongoing & candidate
+        self.samples[ids[opening]] = hits[opening]
+        self.start_ts[ids[opening]] = hit_ts[opening]
+        self.active[ids] = opening | ongoing
+
+        if opening.any() or closing.any():
+            self._queue(ids, ts, mean, opening, closing)
+        self.events += int(opening.sum())
+        return candidate, opening
+
+    def _queue(self, ids, ts, baseline, opening, closing):
+        with self._lock:
+            for i in np.flatnonzero(opening):
+                m = ids[i]
+                self._pending.append(("open", m, (int(self.start_ts[m]), float(self.peak[m]),
+                                                  float(baseline[i]), float(self.peak_z[m]), int(self.samples[m]))))
+            for i in np.flatnonzero(closing):
+                m = ids[i]
+                self._pending.append(("close", m, (int(ts[i]), float(self.peak[m]), float(self.peak_z[m]),
+                                                   int(self.samples[m]), int(self.start_ts[m]))))
+
+    def close_all(self, ts_ms):
+        """Close every open event at ts_ms (e.g. when monitoring stops)."""
+        ids = np.flatnonzero(self.active)
+        if len(ids):
+            no = np.zeros(len(ids), dtype=bool)
+            self._queue(ids, np.full(len(ids), ts_ms, dtype=np.int64), self.mean[ids], no, ~no)
+            self.active[ids] = False
+
+    def open_events(self):
+        """Meter ids with an event in progress."""
+        return np.flatnonzero(self.active)
+
+    def write_events(self, conn, db_ids):
+        """Persist queued event changes; db_ids maps meter ids to appliances.id.
+
+        Shaped to run as a ReadingWriter flush hook (via a lambda), inside
+        the same transaction as the readings.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for kind, m, values in pending:
+            aid = int(db_ids[m])
+            if kind == "open":
+                conn.execute(SURGE_EVENT_OPEN, (aid,) + values)
+            else:
+                conn.execute(SURGE_EVENT_CLOSE, values[:4] + (aid, values[4]))
+
+
+def query_events(conn, start_ms, end_ms, appliance_id=None, limit=None, before=None):
+    """Surge events that started in [start_ms, end_ms), newest first.
+
+    Rows are (appliance_id, start_ts, end_ts, peak_power, baseline, zscore, samples).
+    For keyset paging pass the (start_ts, appliance_id) of the last row seen as before.
+    """
+    where = "start_ts >= ? AND start_ts < ?"
+    params = [start_ms, end_ms]
+    if appliance_id is not None:
+        where = "appliance_id = ? AND " + where
+        params = [appliance_id] + params
+    if before is not None:
+        where += " AND (start_ts, appliance_id) < (?, ?)"
+        params += list(before)
+    sql = f'''SELECT appliance_id, start_ts, end_ts, peak_power, baseline, zscore, samples
+              FROM surge_events WHERE {where} ORDER BY start_ts DESC, appliance_id DESC'''
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return conn.execute(sql, params).fetchall()
@@ -0,0 +1,188 @@
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import numpy as np
+import schema
+from schema import MINUTE_MS, HOUR_MS, ROLLUPS
+
+
+def local_offset_ms():
+    return time.localtime().tm_gmtoff * 1000
+
+
+class Tariff:
+    """Vectorized tariff: monthly kWh slabs, time-of-day multipliers, demand and fixed charges.
+
+    slabs are (up to kWh per month, rate) pairs, the last one open-ended
+    (None). tod lists inclusive local hour windows as (first, last, multiplier)
+    applied to the slab rate. Slabs follow the whole site's cumulative monthly
+    kWh, so each reading is charged exactly the slab span it consumes.
+    """
+
+    def __init__(self, slabs=((None, 7.50),), tod=(), demand_charge=0.0, demand_window_ms=15 * MINUTE_MS,
+                 fixed_charge=0.0, utc_offset_ms=None):
+        limits = [limit for limit, _ in slabs[:-1]]
+        rates = [rate for _, rate in slabs]
+        # Energy charge E(c) for cumulative monthly kWh c is piecewise linear:
+        # breakpoints at the slab limits, slope of the last slab beyond them
+        self.breaks = np.array([0.0] + limits)
+        self.charges = np.concatenate(([0.0], np.cumsum(np.diff(self.breaks) * rates[:-1])))
+        self.top_rate = rates[-1]
+        self.hour_factor = np.ones(24)  # precomputed per-hour rate table
+        for first, last, factor in tod:
+            self.hour_factor[first:last + 1] = factor
+        self.demand_charge = demand_charge  # per kW of peak demand per month
+        self.demand_window_ms = demand_window_ms
+        self.fixed_charge = fixed_charge
+        self.utc_offset_ms = local_offset_ms() if utc_offset_ms is None else utc_offset_ms
+
+    @classmethod
+    def from_config(cls, config):
+        config = dict(config)
+        config["slabs"] = [tuple(s) for s in config.get("slabs", [(None, 7.50)])]
+        config["tod"] = [tuple(t) for t in config.get("tod", [])]
+        return cls(**config)
+
+    def energy_charge(self, cumulative_kwh):
+        c = np.asarray(cumulative_kwh, dtype=np.float64)
+        return (np.interp(c, self.breaks, self.charges)
+                + np.maximum(c - self.breaks[-1], 0) * self.top_rate)
+
+    def month(self, ts_ms):
+        """Local calendar month index (months since 1970-01) of epoch-ms timestamps."""
+        local = np.asarray(ts_ms, dtype=np.int64) + self.utc_offset_ms
+        return local.astype("datetime64[ms]").astype("datetime64[M]").astype(np.int64)
+
+    def month_bounds(self, month):
+        """[start_ms, end_ms) of a local month index."""
+        start, end = np.array([month, month + 1], dtype="datetime64[M]").astype("datetime64[ms]").astype(np.int64)
+        return int(start) - self.utc_offset_ms, int(end) - self.utc_offset_ms
+
+    def price(self, ts_ms, kwh, month_kwh=None):
+        """Cost of each reading.
+
+        month_kwh maps month index -> site kWh already consumed that month and
+        is advanced in place, so consecutive calls continue the slab count.
+        Readings are counted in timestamp order.
+        """
+        ts_ms = np.asarray(ts_ms, dtype=np.int64)
+        kwh = np.asarray(kwh, dtype=np.float64)
+        if month_kwh is None:
+            month_kwh = {}
+        cost = np.empty(len(kwh))
+        if not len(kwh):
+            return cost
+
+        order = np.argsort(ts_ms, kind="stable")
+        ts, k = ts_ms[order], kwh[order]
+        months = self.month(ts)
+        after = np.cumsum(k)
+        starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+        sizes = np.diff(np.r_[starts, len(k)])
+        opening = np.array([month_kwh.get(int(m), 0.0) for m in months[starts]])
+        # Cumulative site kWh within each month, continuing from what was already used
+        after += np.repeat(opening - (after[starts] - k[starts]), sizes)
+        before = after - k
+        for m, total in zip(months[starts], after[starts + sizes - 1]):
+            month_kwh[int(m)] = float(total)
+
+        hours = ((ts + self.utc_offset_ms) // HOUR_MS) % 24
+        cost[order] = (self.energy_charge(after) - self.energy_charge(before)) * self.hour_factor[hours]
+        return cost
+
+    def month_to_date(self, conn, month):
+        """Site kWh already stored for a month, from the minute rollup."""
+        start, end = self.month_bounds(month)
+        row = conn.execute("SELECT SUM(kwh) FROM rollup_1m WHERE bucket >= ? AND bucket < ?",
+                           (start, end)).fetchone()
+        return row[0] or 0.0
+
+    def load_months(self, conn, ts_ms, month_kwh):
+        """Seed month_kwh from the DB for any month in ts_ms it doesn't know yet."""
+        for m in np.unique(self.month(ts_ms)).tolist():
+            if m not in month_kwh:
+                month_kwh[m] = self.month_to_date(conn, m)
+        return month_kwh
+
+    def bill(self, conn, month):
+        """Monthly bill from the rollups: energy, demand and fixed charges."""
+        start, end = self.month_bounds(month)
+        energy = conn.execute("SELECT SUM(cost), SUM(kwh) FROM rollup_1m WHERE bucket >= ? AND bucket < ?",
+                              (start, end)).fetchone()
+        window = self.demand_window_ms
+        # Peak demand: highest site kWh in any demand window, as average kW
+        peak = conn.execute(f'''SELECT MAX(w) FROM (SELECT SUM(kwh) AS w FROM rollup_1m
+                                WHERE bucket >= ? AND bucket < ? GROUP BY bucket - bucket % {window})''',
+                            (start, end)).fetchone()[0] or 0.0
+        demand_kw = peak * HOUR_MS / window
+        bill = {"kwh": energy[1] or 0.0, "energy": energy[0] or 0.0, "demand_kw": demand_kw,
+                "demand": demand_kw * self.demand_charge, "fixed": self.fixed_charge}
+        bill["total"] = bill["energy"] + bill["demand"] + bill["fixed"]
+        return bill
+
+
+def reprice_rollups(conn, tariff, start_ms=None, end_ms=None):
+    """Recompute rollup costs under a new tariff, whole months at a time.
+
+    Minute rollups are re-priced from their kWh; hour and day rollups are
+    summed back up from the minutes. Raw readings are not touched, so their
+    cost column keeps the price charged at ingest time. Returns minute rows updated.
+    """
+    minute = ROLLUPS[0][0]
+    bounds = conn.execute(f"SELECT MIN(bucket), MAX(bucket) FROM {minute}").fetchone()
+    if bounds[0] is None:
+        return 0
+    first = tariff.month(max(bounds[0], start_ms or bounds[0])).item()
+    last = tariff.month(min(bounds[1], end_ms - 1 if end_ms else bounds[1])).item()
+
+    updated = 0
+    for month in range(first, last + 1):
+        lo, hi = tariff.month_bounds(month)
+        with conn:
+            rows = conn.execute(f'''SELECT appliance_id, bucket, kwh FROM {minute}
+                                    WHERE bucket >= ? AND bucket < ?''', (lo, hi)).fetchall()
+            if not rows:
+                continue
+            aid, bucket, kwh = (np.array(col) for col in zip(*rows))
+            cost = tariff.price(bucket, kwh)
+            conn.executemany(f"UPDATE {minute} SET cost = ? WHERE appliance_id = ? AND bucket = ?",
+                             zip(cost.tolist(), aid.tolist(), bucket.tolist()))
+            for table, size in ROLLUPS[1:]:
+                # Local month bounds need not be aligned to coarse UTC buckets
+                b_lo, b_hi = lo - lo % size, hi - hi % size + size
+                conn.execute(f'''UPDATE {table} SET cost = (
+                                     SELECT COALESCE(SUM(m.cost), 0) FROM {minute} m
+                                     WHERE m.appliance_id = {table}.appliance_id
+                                       AND m.bucket >= {table}.bucket AND m.bucket < {table}.bucket + {size})
+                                 WHERE bucket >= ? AND bucket < ?''', (b_lo, b_hi))
+            updated += len(rows)
+        logging.info(f"Re-priced {len(rows)} minute buckets for {np.datetime64(month, 'M')}")
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-price stored rollups or print a monthly bill")
+    parser.add_argument("--db", default="wattfinder_enterprise.db")
+    parser.add_argument("--tariff", help="JSON file with slabs/tod/demand_charge/fixed_charge")
+    parser.add_argument("--reprice", action="store_true", help="rewrite rollup costs with this tariff")
+    parser.add_argument("--bill", metavar="YYYY-MM", help="print the bill for a month")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    config = {}
+    if args.tariff:
+        with open(args.tariff, encoding="utf-8") as f:
+            config = json.load(f)
+    tariff = Tariff.from_config(config)
+    conn = sqlite3.connect(args.db)
+    schema.migrate(conn)
+    if args.reprice:
+        updated = reprice_rollups(conn, tariff)
+        logging.info(f"Re-priced {updated} minute buckets")
+    if args.bill:
+        month = np.datetime64(args.bill, "M").astype(np.int64)
+        for key, value in tariff.bill(conn, int(month)).items():
+            print(f"{key:>10}: {value:,.2f}")
+    conn.close()
@@ -1,9 +1,30 @@
 import sqlite3
 import logging
+import threading
+import time
+
+DB_NAME = "wattfinder_data.db"
+
+# save_data_to_db buffers rows and commits them together once either limit is hit
+BATCH_SIZE = 100
+FLUSH_INTERVAL = 2.0
+
+_conn = None
+_pending = []
+_last_flush = time.monotonic()
+_lock = threading.Lock()
+
+def get_connection():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+    return _conn
 
 def init_db():
     try:
-        conn = sqlite3.connect("wattfinder_data.db")
+        conn = get_connection()
         cursor = conn.cursor()
         cursor.execute('''CREATE TABLE IF NOT EXISTS consumption (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -24,18 +45,36 @@ def init_db():
             anomaly TEXT
         )''')
         conn.commit()
-        conn.close()
     except sqlite3.Error as e:
         logging.error(f"Database initialization error: {e}")
 
 def save_data_to_db(appliance, timestamp, power, kwh, cost, anomaly):
+    with _lock:
+        _pending.append((appliance, timestamp, power, kwh, cost, anomaly))
+        if len(_pending) >= BATCH_SIZE or time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+            _flush_locked()
+
+def flush_pending():
+    with _lock:
+        _flush_locked()
+
+def _flush_locked():
+    global _last_flush
+    _last_flush = time.monotonic()
+    if not _pending:
+        return
     try:
-        conn = sqlite3.connect("wattfinder_data.db")
-        cursor = conn.cursor()
-        cursor.execute('''INSERT INTO consumption (appliance, timestamp, power_w, kwh, cost_inr, anomaly)
-                          VALUES (?, ?, ?, ?, ?, ?)''', 
-                       (appliance, timestamp, power, kwh, cost, anomaly))
-        conn.commit()
-        conn.close()
+        conn = get_connection()
+        with conn:
+            conn.executemany('''INSERT INTO consumption (appliance, timestamp, power_w, kwh, cost_inr, anomaly)
+                                VALUES (?, ?, ?, ?, ?, ?)''', _pending)
     except sqlite3.Error as e:
         logging.error(f"Data saving error: {e}")
+    _pending.clear()
+
+def close_db():
+    global _conn
+    flush_pending()
+    if _conn is not None:
+        _conn.close()
+        _conn = None
@@ -4,7 +4,7 @@ from tkinter import messagebox
 import threading
 import time
 import datetime
-from database import init_db, save_data_to_db
+from database import init_db, save_data_to_db, close_db
 from power_consumption import simulate_power_reading
 from energy_calculation import calculate_metrics
 from ai_assistant import get_ai_response
@@ -18,7 +18,7 @@ class WattFinderApp:
         self.root.configure(bg="#1E3A8A")
         
         # Setup MQTT
-        self.mqtt_client = setup_mqtt()
+        self.mqtt_client = setup_mqtt(on_reading=self.record_mqtt_reading)
 
         # Initialize the database
         init_db()
@@ -63,6 +63,12 @@ class WattFinderApp:
         save_data_to_db(appliance, timestamp, power, kwh, cost, anomaly_text)
         self.update_ai_response(f"Appliance {appliance} status: {anomaly_text}, Power used: {power:.2f}W")
 
+    def record_mqtt_reading(self, appliance, power, surge):
+        # Called on the MQTT network thread; save_data_to_db batches the writes
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        kwh, cost = calculate_metrics(power)
+        save_data_to_db(appliance, timestamp, power, kwh, cost, "Surge Detected" if surge else "Normal")
+
     def send_chat_message(self, event=None):
         message = self.chat_input.get().strip()
         if message:
@@ -85,3 +91,4 @@ if __name__ == "__main__":
     root = tk.Tk()
     app = WattFinderApp(root)
     root.mainloop()
+    close_db()
@@ -1,16 +1,39 @@
-import paho.mqtt.client as mqtt
+import os
+import json
+import math
 import logging
+import paho.mqtt.client as mqtt
+
+# Broker settings (override with environment variables to test against a local broker)
+MQTT_HOST = os.environ.get("WATTFINDER_MQTT_HOST", "broker.hivemq.com")
+MQTT_PORT = int(os.environ.get("WATTFINDER_MQTT_PORT", 1883))
+MQTT_TOPIC = os.environ.get("WATTFINDER_MQTT_TOPIC", "wattfinder/meters/+/power")
 
 def on_connect(client, userdata, flags, reason_code, properties=None):
     logging.info(f"Connected to MQTT broker with code {reason_code}")
+    client.subscribe(userdata["topic"])
 
 def on_message(client, userdata, msg):
-    logging.info(f"Message received: {msg.payload.decode()}")
-    # Implement your message handling logic here
+    # Topic is wattfinder/meters/<appliance>/power, payload {"power": W, "surge": bool}
+    try:
+        appliance = msg.topic.split("/")[-2]
+        data = json.loads(msg.payload)
+        power = float(data["power"])
+        if not math.isfinite(power):
+            raise ValueError(f"non-finite power {power}")
+        surge = bool(data.get("surge"))
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+        # TypeError/AttributeError: JSON that isn't an object, or "power": null
+        logging.warning(f"Bad MQTT message on {msg.topic}: {e}")
+        return
+    if userdata["on_reading"]:
+        userdata["on_reading"](appliance, power, surge)
 
-def setup_mqtt():
-    client = mqtt.Client(client_id="", protocol=mqtt.MQTTv5)
+def setup_mqtt(on_reading=None, host=MQTT_HOST, port=MQTT_PORT, topic=MQTT_TOPIC):
+    userdata = {"topic": topic, "on_reading": on_reading}
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id="", protocol=mqtt.MQTTv5,
+                         userdata=userdata)
     client.on_connect = on_connect
     client.on_message = on_message
-    client.connect("broker.hivemq.com", 1883, 60)  # Replace with your broker address
+    client.connect(host, port, 60)
     return client
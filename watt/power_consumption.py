@@ -1,5 +1,6 @@
 import random
 from datetime import datetime
+import numpy as np
 
 APPLIANCES = {
     "Fridge": {"power_range": (100, 200), "surge_prob": 0.05, "surge_factor": 2.5},
@@ -21,3 +22,20 @@ def simulate_power_reading(appliance, hour=None):
         return power, True  # Surge detected
     return power, False  # No surge
 
+
+def simulate_power_block(appliances, ticks, seed=None):
+    """Vectorized version of simulate_power_reading for load tests.
+
+    Returns (power, anomaly) arrays of shape (len(appliances), ticks) drawn
+    from one seeded NumPy Generator, so the same seed gives the same block.
+    """
+    rng = np.random.default_rng(seed)
+    cfg = [APPLIANCES[a] for a in appliances]
+    low = np.array([c["power_range"][0] for c in cfg], dtype=float)[:, None]
+    high = np.array([c["power_range"][1] for c in cfg], dtype=float)[:, None]
+    prob = np.array([c["surge_prob"] for c in cfg])[:, None]
+    factor = np.array([c["surge_factor"] for c in cfg])[:, None]
+    shape = (len(cfg), ticks)
+    power = low + (high - low) * rng.random(shape)
+    anomaly = rng.random(shape) < prob
+    return np.where(anomaly, power * factor, power), anomaly
@@ -2,9 +2,7 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
-import random
 import time
-import sqlite3
 import threading
 from datetime import datetime
 import matplotlib.pyplot as plt
@@ -13,6 +11,16 @@ import requests
 import logging
 import warnings
 import json
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from backend import EnergyBackend, HISTORY_WINDOW
+from read_api import API_HOST, API_PORT
+from remote_backend import RemoteBackend
+from metrics import Histogram
+from meter_registry import STATUS_LABELS
 
 # --- Universal Import Fix ---
 warnings.simplefilter("ignore") 
@@ -31,20 +39,41 @@ logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
 
 # API Configuration
 GEMINI_API_KEY = " "
-COST_PER_KWH = 7.50  # INR
-
-APPLIANCES_CONFIG = {
-    "Fridge": {"range": (100, 200), "surge": 2.5, "prob": 0.05, "goal": 2.0, "icon": "🧊"},
-    "AC Unit": {"range": (800, 1500), "surge": 1.8, "prob": 0.02, "goal": 10.0, "icon": "❄️"},
-    "Washing Machine": {"range": (500, 1000), "surge": 2.0, "prob": 0.03, "goal": 2.5, "icon": "🧺"},
-    "Smart TV": {"range": (50, 150), "surge": 1.5, "prob": 0.01, "goal": 1.5, "icon": "📺"},
-    "Microwave": {"range": (800, 1200), "surge": 1.2, "prob": 0.04, "goal": 1.0, "icon": "🍕"}
-}
+AI_BASE_URL = os.environ.get("WATTFINDER_AI_URL", "https://generativelanguage.googleapis.com/v1beta")
+AI_TIMEOUT = 10
+AI_CACHE_SIZE = 64
+AI_CACHE_TTL = 300  # seconds an answer is reused for the same question and similar data
+AI_MODEL_404_COOLDOWN = 3600  # seconds a model that returned 404 is skipped
+AI_HEDGE_DELAY = 2.0  # seconds to wait on a model before also asking the next one (None = sequential)
+AI_MAX_CONCURRENT_ASKS = 4  # questions whose hedges get their own workers
+
+# Running collector (`collector.py --api`) to mirror; the dashboard collects in-process when none answers
+COLLECTOR_URL = os.environ.get("WATTFINDER_COLLECTOR_URL", f"http://{API_HOST}:{API_PORT}")
+
+# Graph rendering
+GRAPH_COLORS = {'Fridge': '#3498db', 'AC Unit': '#e74c3c', 'Washing Machine': '#2ecc71',
+                'Smart TV': '#f39c12', 'Microwave': '#9b59b6'}
+GRAPH_MAX_POINTS = 1000  # longer series are decimated to about this many points
+GRAPH_INITIAL_XSPAN = 60
+
+# Minimum seconds between two dashboard refreshes
+UI_REFRESH_INTERVAL = 0.5
 
 # --- Backend Logic (Data & AI) ---
 
+def connect_backend(url=COLLECTOR_URL):
+    """Mirror the collector at url if one is running, else fall back to an in-process EnergyBackend."""
+    if url:
+        try:
+            backend = RemoteBackend(url)
+            logging.info(f"Following collector at {url}")
+            return backend
+        except (OSError, ValueError, KeyError) as e:
+            logging.info(f"No collector at {url} ({e}); collecting in-process")
+    return EnergyBackend()
+
 class AIAssistant:
-    def __init__(self):
+    def __init__(self, base_url=AI_BASE_URL, api_key=GEMINI_API_KEY, hedge_delay=AI_HEDGE_DELAY):
         self.context = (
             "You are WattFinder AI, an enterprise energy efficiency expert. "
             "Analyze power data and provide actionable, professional advice. "
@@ -53,189 +82,165 @@ class AIAssistant:
         )
         # List of models to try in order of preference (Failover System)
         self.model_fallbacks = ["gemini-1.5-flash", "gemini-1.5-flash-001", "gemini-pro"]
-
-    def ask(self, prompt):
-        headers = {"Content-Type": "application/json"}
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+
+        # One pooled HTTP session per thread (requests.Session isn't thread-safe)
+        self._local = threading.local()
+
+        # LRU/TTL answer cache, in-flight requests, and models that returned 404
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._model_blocked_until = {}
+
+        # Hedged fallback: None tries models strictly one after another. Sized so a
+        # question's hedges don't queue behind requests other questions gave up on.
+        self.hedge_delay = hedge_delay
+        self._pool = ThreadPoolExecutor(max_workers=len(self.model_fallbacks) * AI_MAX_CONCURRENT_ASKS,
+                                        thread_name_prefix="ai")
+        self.latency = {model: Histogram() for model in self.model_fallbacks}
+
+    def ask(self, prompt, context=None):
+        """Answer prompt, with optional live data context.
+
+        Identical questions asked against roughly the same data (numbers in
+        the context are bucketed) are answered from cache, and concurrent
+        duplicates share one HTTP call.
+        """
+        key = (_normalize_prompt(prompt), _bucket_numbers(context or ""))
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit and hit[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                return hit[1]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+
+        if not owner:
+            return future.result()
+
+        full_prompt = f"{context}\n\nUser Question: {prompt}" if context else prompt
+        try:
+            answer = self._request(full_prompt)
+        except Exception as e:
+            logging.error(f"AI request failed: {e}")
+            answer = None
+        with self._lock:
+            del self._inflight[key]
+            if answer is not None:
+                self._cache[key] = (time.monotonic() + AI_CACHE_TTL, answer)
+                self._cache.move_to_end(key)
+                while len(self._cache) > AI_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+
+        answer = answer or "⚠️ AI Service Unavailable. Please check internet connection."
+        future.set_result(answer)
+        return answer
+
+    def _request(self, full_prompt):
         payload = {
             "contents": [{
-                "parts": [{"text": f"{self.context}\n\n{prompt}"}]
+                "parts": [{"text": f"{self.context}\n\n{full_prompt}"}]
             }],
             "generationConfig": {
                 "temperature": 0.7,
                 "maxOutputTokens": 200
             }
         }
+        # Skip models known to be missing
+        models = [m for m in self.model_fallbacks if self._model_blocked_until.get(m, 0) <= time.monotonic()]
+        if self.hedge_delay is None:
+            return self._request_sequential(models, payload)
+        return self._request_hedged(models, payload)
 
+    def _request_sequential(self, models, payload):
         # Try models in sequence until one works
-        for model in self.model_fallbacks:
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={GEMINI_API_KEY}"
-            try:
-                response = requests.post(url, headers=headers, json=payload, timeout=10)
-                
-                if response.status_code == 200:
-                    try:
-                        data = response.json()
-                        return data['candidates'][0]['content']['parts'][0]['text'].strip()
-                    except (KeyError, IndexError):
-                        continue # Try next model if response format is unexpected
-                elif response.status_code == 404:
-                    logging.warning(f"Model {model} not found (404). Switching to fallback...")
-                    continue # Try next model
+        for model in models:
+            answer = self._try_model(model, payload)
+            if answer is not None:
+                return answer
+        return None
+
+    def _request_hedged(self, models, payload):
+        """Start the primary model; every hedge_delay without an answer (or on a failure) start the next.
+
+        The first good answer wins. Hedges that haven't sent their request yet
+        are stopped; requests already in flight can't be aborted, so they run
+        to completion in the background and their answers are discarded.
+        """
+        stop = threading.Event()
+        pending = set()
+        remaining = list(models)
+        try:
+            while remaining or pending:
+                if remaining:
+                    pending.add(self._pool.submit(self._try_model, remaining.pop(0), payload, stop))
+                    timeout = self.hedge_delay
                 else:
-                    logging.error(f"API Error {response.status_code} on {model}: {response.text[:100]}")
-                    
-            except requests.exceptions.RequestException as e:
-                logging.error(f"Connection error on {model}: {e}")
-                continue
-
-        return "⚠️ AI Service Unavailable. Please check internet connection."
+                    timeout = None
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    answer = future.result()
+                    if answer is not None:
+                        return answer
+            return None
+        finally:
+            stop.set()
+            for future in pending:
+                future.cancel()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers.update({"Content-Type": "application/json"})
+        return session
+
+    def _try_model(self, model, payload, stop=None):
+        """One generateContent call. Returns the answer text or None (also when stop is already set)."""
+        if stop is not None and stop.is_set():
+            return None
+        url = f"{self.base_url}/models/{model}:generateContent?key={self.api_key}"
+        started = time.monotonic()
+        try:
+            response = self._session().post(url, json=payload, timeout=AI_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Connection error on {model}: {e}")
+            return None
+        finally:
+            self.latency[model].observe(time.monotonic() - started)
+
+        if response.status_code == 200:
+            try:
+                data = response.json()
+                return data['candidates'][0]['content']['parts'][0]['text'].strip()
+            except (KeyError, IndexError, ValueError):
+                return None # Try next model if response format is unexpected
+        elif response.status_code == 404:
+            logging.warning(f"Model {model} not found (404). Skipping it for {AI_MODEL_404_COOLDOWN}s...")
+            self._model_blocked_until[model] = time.monotonic() + AI_MODEL_404_COOLDOWN
+        else:
+            logging.error(f"API Error {response.status_code} on {model}: {response.text[:100]}")
+        return None
 
-class EnergyBackend:
-    def __init__(self):
-        self.db_name = "wattfinder_enterprise.db"
-        self.init_db()
-        self.running = False
-        self.data_buffer = {k: [] for k in APPLIANCES_CONFIG.keys()}
-        self.latest_readings = {k: {'power': 0, 'kwh': 0, 'cost': 0, 'status': 'Off'} for k in APPLIANCES_CONFIG}
-        self.surge_count = {k: 0 for k in APPLIANCES_CONFIG}
-        self.session_start = None
-
-    def init_db(self):
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''CREATE TABLE IF NOT EXISTS readings 
-                              (id INTEGER PRIMARY KEY, appliance TEXT, timestamp TEXT, 
-                               power REAL, kwh REAL, cost REAL, status TEXT)''')
-            cursor.execute('''CREATE TABLE IF NOT EXISTS sessions 
-                              (id INTEGER PRIMARY KEY, start_time TEXT, end_time TEXT,
-                               total_kwh REAL, total_cost REAL, surges INTEGER)''')
-            conn.commit()
-
-    def simulate_reading(self, appliance):
-        cfg = APPLIANCES_CONFIG[appliance]
-        hour = datetime.now().hour
-        
-        # Enhanced time-of-day logic
-        is_active = True
-        if appliance == "Microwave" and not (7 <= hour <= 9 or 18 <= hour <= 21): 
-            is_active = False
-        if appliance == "Washing Machine" and not (8 <= hour <= 13): 
-            is_active = False
-        if appliance == "AC Unit" and not (10 <= hour <= 23):
-            is_active = False
-        
-        if not is_active:
-            return 0, "Standby"
+    def latency_report(self):
+        """Per-model request latency histograms (seconds)."""
+        return {model: hist.snapshot() for model, hist in self.latency.items()}
 
-        base_power = random.uniform(*cfg['range'])
-        status = "Normal"
-        
-        # Surge detection
-        if random.random() < cfg['prob']:
-            base_power *= cfg['surge']
-            status = "⚠️ SURGE"
-            self.surge_count[appliance] += 1
-        
-        return base_power, status
 
-    def start_monitoring(self, update_callback):
-        self.running = True
-        self.session_start = datetime.now()
-        threading.Thread(target=self._monitor_loop, args=(update_callback,), daemon=True).start()
+def _normalize_prompt(prompt):
+    return " ".join(prompt.lower().split()).rstrip("?!. ")
 
-    def stop_monitoring(self):
-        if self.running:
-            self.running = False
-            self._save_session()
 
-    def _save_session(self):
-        if not self.session_start:
-            return
-            
-        total_kwh = sum(r['kwh'] for r in self.latest_readings.values())
-        total_cost = sum(r['cost'] for r in self.latest_readings.values())
-        total_surges = sum(self.surge_count.values())
-        
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO sessions (start_time, end_time, total_kwh, total_cost, surges) VALUES (?,?,?,?,?)",
-                (self.session_start.strftime("%Y-%m-%d %H:%M:%S"),
-                 datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                 total_kwh, total_cost, total_surges)
-            )
-            conn.commit()
-
-    def _monitor_loop(self, update_callback):
-        while self.running:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            with sqlite3.connect(self.db_name) as conn:
-                cursor = conn.cursor()
-                
-                for app_name in APPLIANCES_CONFIG:
-                    power, status = self.simulate_reading(app_name)
-                    
-                    # Calculate metrics (2 second interval)
-                    kwh_inc = (power * (2/3600)) / 1000 
-                    cost_inc = kwh_inc * COST_PER_KWH
-                    
-                    # Update state
-                    prev = self.latest_readings[app_name]
-                    new_kwh = prev['kwh'] + kwh_inc
-                    new_cost = prev['cost'] + cost_inc
-                    
-                    self.latest_readings[app_name] = {
-                        'power': power,
-                        'kwh': new_kwh,
-                        'cost': new_cost,
-                        'status': status
-                    }
-                    
-                    # Buffer for graphing
-                    self.data_buffer[app_name].append(power)
-                    if len(self.data_buffer[app_name]) > 50:
-                        self.data_buffer[app_name].pop(0)
-
-                    # DB logging
-                    cursor.execute(
-                        "INSERT INTO readings (appliance, timestamp, power, kwh, cost, status) VALUES (?,?,?,?,?,?)",
-                        (app_name, timestamp, power, kwh_inc, cost_inc, status)
-                    )
-            
-                conn.commit()
-            
-            try:
-                update_callback()
-            except RuntimeError:
-                break
-            
-            time.sleep(2)
-
-    def get_history_data(self):
-        return self.data_buffer
-    
-    def get_insights_summary(self):
-        """Generate data summary for AI context"""
-        readings = self.latest_readings
-        total_power = sum(r['power'] for r in readings.values())
-        total_cost = sum(r['cost'] for r in readings.values())
-        
-        # Find top consumers
-        sorted_apps = sorted(readings.items(), key=lambda x: x[1]['cost'], reverse=True)
-        top_3 = [(name, data['cost'], data['kwh']) for name, data in sorted_apps[:3]]
-        
-        # Surge analysis
-        surge_apps = [name for name, count in self.surge_count.items() if count > 0]
-        
-        summary = f"""Current System Status:
-- Total Load: {total_power:.0f}W
-- Session Cost: ₹{total_cost:.2f}
-- Top Consumers: {', '.join([f"{n} (₹{c:.2f})" for n,c,_ in top_3])}
-- Surges Detected: {', '.join(surge_apps) if surge_apps else 'None'}
-- Total Surge Events: {sum(self.surge_count.values())}"""
-        
-        return summary
+def _bucket_numbers(text, digits=2):
+    """Round every number in text to `digits` significant figures so small changes share a cache key."""
+    def bucket(match):
+        value = float(match.group())
+        return f"{value:.{digits}g}" if value else "0"
+    return re.sub(r"\d+(?:\.\d+)?", bucket, text)
 
 # --- UI Components ---
 
@@ -250,14 +255,19 @@ class DashboardApp(ttk.Window):
         except AttributeError:
             pass 
         
-        self.backend = EnergyBackend()
+        self.backend = connect_backend()
         self.ai = AIAssistant()
         
         self.meters = {}
         self.stat_labels = {}
+
+        # Set by the monitor thread, polled by the Tk main loop; last-rendered widget options
+        self._ui_dirty = False
+        self._rendered = {}
         
-        self._setup_ui()
         plt.style.use('dark_background')
+        self._setup_ui()
+        self._poll_ui()
 
     def _setup_ui(self):
         # Sidebar
@@ -319,7 +329,7 @@ class DashboardApp(ttk.Window):
         self.appliance_frame = scroll_container
         
         row, col = 0, 0
-        for app in APPLIANCES_CONFIG:
+        for app in self.backend.registry.names:
             self._create_appliance_widget(self.appliance_frame, app, row, col)
             col += 1
             if col > 2:
@@ -340,7 +350,7 @@ class DashboardApp(ttk.Window):
         return val_lbl
 
     def _create_appliance_widget(self, parent, name, row, col):
-        cfg = APPLIANCES_CONFIG[name]
+        cfg = self.backend.registry.configs[name]
         frame = ttk.Labelframe(parent, text=f" {cfg['icon']} {name} ", padding=15, bootstyle="info")
         frame.grid(row=row, column=col, sticky="nsew", padx=10, pady=10)
         parent.columnconfigure(col, weight=1)
@@ -423,13 +433,47 @@ class DashboardApp(ttk.Window):
         
         self.canvas = FigureCanvasTkAgg(self.fig, master=graph_frame)
         self.canvas.get_tk_widget().pack(fill=BOTH, expand=True)
+        self._init_graph()
+
+    def _init_graph(self):
+        """Static axes decoration and one persistent animated line per appliance."""
+        self.ax.set_title("Power Consumption Trends", color='white', fontsize=12, fontweight='bold')
+        self.ax.set_ylabel("Watts", color='white', fontsize=10)
+        self.ax.set_xlabel("Time (ticks)", color='white', fontsize=10)
+        self.ax.tick_params(colors='white', labelsize=8)
+        self.ax.grid(True, color='#444444', linestyle='--', linewidth=0.5, alpha=0.7)
+        self.ax.set_xlim(0, GRAPH_INITIAL_XSPAN)
+        self.ax.set_ylim(0, 100)
+
+        self.graph_lines = {}
+        for name in self.backend.registry.names:
+            line, = self.ax.plot([], [], label=name, color=GRAPH_COLORS.get(name, '#ffffff'),
+                                 linewidth=2, animated=True)
+            line.set_visible(False)
+            self.graph_lines[name] = line
+        self.ax.legend(facecolor='#333333', labelcolor='white', fontsize=9, loc='upper left', 
+                       framealpha=0.9)
+
+        # Background (everything except the lines) is re-captured after every full draw
+        self._graph_bg = None
+        self.canvas.mpl_connect('draw_event', self._on_graph_draw)
+
+    def _on_graph_draw(self, event):
+        self._graph_bg = self.canvas.copy_from_bbox(self.ax.bbox)
+        for line in self.graph_lines.values():
+            self.ax.draw_artist(line)
 
     # --- Core Logic ---
 
     def start_system(self):
         if not self.backend.running:
+            try:
+                self.backend.start_monitoring(self.schedule_ui_update, self.backend.open_source())
+            except Exception as e:
+                logging.error(f"Could not start monitoring: {e}")
+                self.append_chat("System", f"⚠️ Could not start monitoring: {e}")
+                return
             self.status_lbl.configure(text="🟢 ONLINE", bootstyle="success-inverse")
-            self.backend.start_monitoring(self.schedule_ui_update)
             self.append_chat("System", "✅ Monitoring started. Collecting real-time data...")
 
     def stop_system(self):
@@ -438,64 +482,102 @@ class DashboardApp(ttk.Window):
         self.append_chat("System", "⏸ Monitoring paused. Session data saved.")
 
     def schedule_ui_update(self):
-        self.after(0, self.update_ui)
+        """Called from the monitor thread. Only sets a flag: no Tk calls, so it never waits on the main loop."""
+        self._ui_dirty = True
+
+    def _poll_ui(self):
+        """Main-thread loop: render at most one frame per UI_REFRESH_INTERVAL when new data arrived."""
+        if self._ui_dirty:
+            self._ui_dirty = False
+            self.update_ui()
+        self.after(int(UI_REFRESH_INTERVAL * 1000), self._poll_ui)
+
+    def _configure_if_changed(self, widget, **options):
+        """Configure a widget with only the options that differ from what was last rendered."""
+        rendered = self._rendered.setdefault(widget, {})
+        changed = {key: value for key, value in options.items() if key not in rendered or rendered[key] != value}
+        if changed:
+            widget.configure(**changed)
+            rendered.update(changed)
 
     def update_ui(self):
-        readings = self.backend.latest_readings
-        total_watts = 0
-        total_cost = 0
-        total_surges = sum(self.backend.surge_count.values())
-
-        for name, data in readings.items():
-            self.meters[name].configure(amountused=int(data['power']))
-            
-            if data['status'] == "⚠️ SURGE":
-                self.meters[name].configure(bootstyle="danger")
-            elif data['power'] == 0:
-                self.meters[name].configure(bootstyle="secondary")
+        snap = self.backend.snapshot
+        names = [name for name in self.meters if self.backend.registry.index[name] < snap.n]
+        idx = [self.backend.registry.index[name] for name in names]
+        power = snap.power[idx].tolist()
+        kwh = snap.kwh[idx].tolist()
+        cost = snap.cost[idx].tolist()
+        status = STATUS_LABELS[snap.status[idx]].tolist()
+
+        for name, p, k, c, st in zip(names, power, kwh, cost, status):
+            if st == "⚠️ SURGE":
+                meter_style = "danger"
+            elif p == 0:
+                meter_style = "secondary"
             else:
-                self.meters[name].configure(bootstyle="success")
-
-            self.stat_labels[name]['kwh'].configure(text=f"{data['kwh']:.3f} kWh")
-            self.stat_labels[name]['cost'].configure(text=f"₹{data['cost']:.2f}")
-            self.stat_labels[name]['status'].configure(
-                text=f"● {data['status']}", 
-                bootstyle="danger" if "SURGE" in data['status'] else "success"
-            )
-
-            total_watts += data['power']
-            total_cost += data['cost']
-
-        # Update KPIs
-        self.card_total_power.configure(text=f"{int(total_watts)} W")
-        self.card_total_cost.configure(text=f"₹{total_cost:.2f}")
-        self.card_surges.configure(text=str(total_surges))
-        
-        eff = max(0, 100 - (total_watts / 5000 * 100))
-        self.card_efficiency.configure(text=f"{eff:.1f}%")
+                meter_style = "success"
+            self._configure_if_changed(self.meters[name], amountused=int(p), bootstyle=meter_style)
+
+            labels = self.stat_labels[name]
+            self._configure_if_changed(labels['kwh'], text=f"{k:.3f} kWh")
+            self._configure_if_changed(labels['cost'], text=f"₹{c:.2f}")
+            self._configure_if_changed(labels['status'], text=f"● {st}",
+                                       bootstyle="danger" if "SURGE" in st else "success")
+
+        # Update KPIs (fleet-wide, including meters without a widget)
+        total_watts = snap.total_power
+        self._configure_if_changed(self.card_total_power, text=f"{int(total_watts)} W")
+        self._configure_if_changed(self.card_total_cost, text=f"₹{snap.total_cost:.2f}")
+        self._configure_if_changed(self.card_surges, text=str(snap.total_surges))
+        
+        # Daily goals as a share of today's projected use (100% = on or under budget)
+        forecast = self.backend.forecast
+        eff = 100.0
+        if forecast is not None:
+            budgeted = forecast["goal_day_kwh"] > 0
+            projected = forecast["day_projected_kwh"][budgeted].sum()
+            if projected > 0:
+                eff = min(100.0, forecast["goal_day_kwh"][budgeted].sum() / projected * 100)
+        self._configure_if_changed(self.card_efficiency, text=f"{eff:.1f}%")
 
         self.update_graph()
 
     def update_graph(self):
-        self.ax.clear()
         history = self.backend.get_history_data()
-        
-        colors = {'Fridge': '#3498db', 'AC Unit': '#e74c3c', 'Washing Machine': '#2ecc71',
-                  'Smart TV': '#f39c12', 'Microwave': '#9b59b6'}
-        
-        for name, values in history.items():
-            if values and max(values) > 10:
-                self.ax.plot(values, label=name, color=colors.get(name, '#ffffff'), linewidth=2)
+        need_full_draw = self._graph_bg is None
+        x_max = 0
+        y_max = 0
 
-        self.ax.set_title("Power Consumption Trends", color='white', fontsize=12, fontweight='bold')
-        self.ax.set_ylabel("Watts", color='white', fontsize=10)
-        self.ax.set_xlabel("Time (ticks)", color='white', fontsize=10)
-        self.ax.tick_params(colors='white', labelsize=8)
-        self.ax.grid(True, color='#444444', linestyle='--', linewidth=0.5, alpha=0.7)
-        self.ax.legend(facecolor='#333333', labelcolor='white', fontsize=9, loc='upper left', 
-                       framealpha=0.9)
-        
-        self.canvas.draw()
+        for name, line in self.graph_lines.items():
+            values = history.get(name)
+            if values is None or not len(values):
+                continue
+            step = max(1, len(values) // GRAPH_MAX_POINTS)
+            x = np.arange(0, len(values), step)
+            line.set_data(x, values[::step])
+            peak = values.max()
+            line.set_visible(peak > 10)
+            x_max = max(x_max, len(values))
+            y_max = max(y_max, peak)
+
+        # Only rescale when data leaves the current view; that needs a full redraw
+        x_lo, x_hi = self.ax.get_xlim()
+        if x_max > x_hi:
+            self.ax.set_xlim(0, min(HISTORY_WINDOW, x_hi * 2))
+            need_full_draw = True
+        y_lo, y_hi = self.ax.get_ylim()
+        if y_max > y_hi:
+            self.ax.set_ylim(0, y_max * 1.2)
+            need_full_draw = True
+
+        if need_full_draw:
+            self.canvas.draw()  # draw_event re-captures the background and draws the lines
+            return
+
+        self.canvas.restore_region(self._graph_bg)
+        for line in self.graph_lines.values():
+            self.ax.draw_artist(line)
+        self.canvas.blit(self.ax.bbox)
 
     # --- AI Functions ---
 
@@ -532,7 +614,7 @@ class DashboardApp(ttk.Window):
 
     def quick_insights(self):
         """Quick insights button"""
-        if not self.backend.running and sum(r['cost'] for r in self.backend.latest_readings.values()) == 0:
+        if not self.backend.running and self.backend.snapshot.total_cost == 0:
             self.append_chat("System", "⚠️ Start monitoring first to get insights!")
             return
         
@@ -543,14 +625,14 @@ class DashboardApp(ttk.Window):
         # Build comprehensive context
         summary = self.backend.get_insights_summary()
         
-        full_prompt = f"{summary}\n\nUser Question: {user_prompt}"
-        
-        response = self.ai.ask(full_prompt)
+        response = self.ai.ask(user_prompt, summary)
         self.after(0, lambda: self.append_chat("WattFinder AI", response))
 
     def on_close(self):
-        self.backend.stop_monitoring()
-        self.destroy()
+        try:
+            self.backend.stop_monitoring()
+        finally:
+            self.destroy()
 
 if __name__ == "__main__":
     app = DashboardApp()